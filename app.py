@@ -17,13 +17,18 @@ from sqlalchemy import text
 from config import Config
 
 # Import utility functions from utils package
-from utils.security import RateLimiter, clean_expired_sessions
+from utils.security import RateLimiter, detail_access_url, compute_like_fingerprint
+from utils.sessions import create_session_interface, purge_expired_sessions
 
 # Import services
 from services.moderation import moderate_content
 from services.file_processing import generate_document_placeholder
 from services.email import send_email_async
 from services.thumbnails import generate_thumbnails_async
+from services.stats import get_site_stats
+from services.search import rebuild_search_keys
+from services.likes import refresh_like_filter
+from services.comment_moderation import requeue_stale_comments
 
 app = Flask(__name__)
 app.config.from_object(Config)
@@ -96,6 +101,8 @@ def inject_globals():
         "generate_csrf": generate_csrf,
         "t": t,
         "current_lang": get_locale,
+        "site_stats": get_site_stats,
+        "detail_url": detail_access_url,
     }
 
 # Add security headers for all routes
@@ -127,6 +134,10 @@ csrf = CSRFProtect(app)
 # Configure session settings
 from datetime import timedelta
 app.permanent_session_lifetime = timedelta(seconds=app.config['PERMANENT_SESSION_LIFETIME'])
+# 服务端session：cookie只保存会话ID，过期由存储层按行判断
+session_interface = create_session_interface(app, db)
+if session_interface is not None:
+    app.session_interface = session_interface
 
 # Setup rate limiting
 limiter = Limiter(
@@ -142,6 +153,7 @@ app.rate_limiter = global_rate_limiter
 
 # 确保所有模型在应用启动时都注册到SQLAlchemy
 from models import init_models
+from models.indexes import ensure_hot_query_indexes
 
 # Create models in app context
 with app.app_context():
@@ -158,11 +170,7 @@ with app.app_context():
     AppealEvidence = model_classes['AppealEvidence']
     Like = model_classes['Like']
     Comment = model_classes['Comment']
-
-@app.before_request
-def before_request_cleanup():
-    """每个请求前清理过期的session"""
-    clean_expired_sessions()
+    SubmissionSearchKey = model_classes['SubmissionSearchKey']
 
 def ensure_schema_migrations():
     # PostgreSQL schema migration
@@ -289,13 +297,18 @@ def ensure_schema_migrations():
                 CREATE TABLE likes (
                     id SERIAL PRIMARY KEY,
                     submission_id INTEGER NOT NULL REFERENCES submissions(id) ON DELETE CASCADE,
-                    user_ip VARCHAR(45) NOT NULL,
-                    user_agent_hash VARCHAR(64) NOT NULL,
+                    fingerprint BIGINT NOT NULL,
                     created_at TIMESTAMP NOT NULL DEFAULT NOW()
                 );
-                CREATE INDEX idx_likes_submission_id ON likes(submission_id);
-                CREATE INDEX idx_likes_user_ip ON likes(user_ip);
-                CREATE UNIQUE INDEX unique_like_per_user ON likes(submission_id, user_ip, user_agent_hash);
+                CREATE UNIQUE INDEX unique_like_fingerprint ON likes(submission_id, fingerprint);
+            END IF;
+            
+            -- 点赞指纹改为64位BIGINT：先加可空列，由 migrate_like_fingerprints() 回填后收尾
+            IF NOT EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_name='likes' AND column_name='fingerprint'
+            ) THEN
+                ALTER TABLE likes ADD COLUMN fingerprint BIGINT NULL;
             END IF;
             
             -- 添加点赞数缓存字段
@@ -350,12 +363,114 @@ def ensure_schema_migrations():
                 CREATE INDEX idx_comments_user_ip ON comments(user_ip);
             END IF;
             
+            -- 为评论表添加审核完成时间（评论改为后台异步审核）；已有评论均已同步审核过
+            IF NOT EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_name='comments' AND column_name='moderated_at'
+            ) THEN
+                ALTER TABLE comments ADD COLUMN moderated_at TIMESTAMP NULL;
+                UPDATE comments SET moderated_at = created_at;
+            END IF;
+            
+            -- 为评论表添加重新入队时间（周期任务补审延后或丢失的审核任务）
+            IF NOT EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_name='comments' AND column_name='moderation_requeued_at'
+            ) THEN
+                ALTER TABLE comments ADD COLUMN moderation_requeued_at TIMESTAMP NULL;
+            END IF;
+            
+            -- 添加评论数缓存字段，并用现有评论初始化
+            IF NOT EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_name='submissions' AND column_name='comment_count'
+            ) THEN
+                ALTER TABLE submissions ADD COLUMN comment_count INTEGER NOT NULL DEFAULT 0;
+                UPDATE submissions s SET comment_count = c.cnt
+                FROM (
+                    SELECT submission_id, COUNT(*) AS cnt FROM comments
+                    WHERE status = 'approved' AND deleted = FALSE
+                    GROUP BY submission_id
+                ) c
+                WHERE c.submission_id = s.id;
+            END IF;
+            
+            -- 添加评论版本号字段（评论接口ETag使用）
+            IF NOT EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_name='submissions' AND column_name='comments_version'
+            ) THEN
+                ALTER TABLE submissions ADD COLUMN comments_version INTEGER NOT NULL DEFAULT 0;
+            END IF;
+            
+            -- 添加公开内容版本号字段（跨worker失效首页/搜索缓存）
+            IF NOT EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_name='site_stats' AND column_name='content_version'
+            ) THEN
+                ALTER TABLE site_stats ADD COLUMN content_version INTEGER NOT NULL DEFAULT 0;
+            END IF;
+            
             -- 首次添加字段时的初始化（已完成，注释掉避免重复执行）
             -- UPDATE submissions SET allow_public_evidence = TRUE WHERE allow_public_evidence = FALSE;
             -- UPDATE submissions SET privacy_homepage = TRUE WHERE privacy_homepage = FALSE;
         END $$;
         """
     ))
+    
+    db.session.commit()
+    migrate_like_fingerprints()
+    
+    # 热点查询的复合/部分/函数索引（见 models/indexes.py）
+    ensure_hot_query_indexes(db)
+    db.session.commit()
+    
+    # 查找键表为空时（首次部署）用现有提交记录回填，之后由写入路径维护
+    if db.session.query(SubmissionSearchKey.id).first() is None and db.session.query(Submission.id).first() is not None:
+        rebuild_search_keys()
+
+def migrate_like_fingerprints(batch_size: int = 5000):
+    """
+    将旧的 (user_ip, user_agent_hash) 点赞去重键迁移为64位指纹：
+    分批回填 fingerprint，删除哈希碰撞产生的重复行，建立 (submission_id, fingerprint)
+    唯一索引后删除旧列（旧列上的 unique_like_per_user / idx_likes_user_ip 等索引随列一起删除）
+    """
+    has_legacy_columns = db.session.execute(text(
+        "SELECT 1 FROM information_schema.columns WHERE table_name='likes' AND column_name='user_ip'"
+    )).first()
+    if not has_legacy_columns:
+        return
+    
+    migrated = 0
+    while True:
+        rows = db.session.execute(text(
+            "SELECT id, user_ip, user_agent_hash FROM likes WHERE fingerprint IS NULL ORDER BY id LIMIT :limit"
+        ), {"limit": batch_size}).all()
+        if not rows:
+            break
+        db.session.execute(
+            text("UPDATE likes SET fingerprint = :fingerprint WHERE id = :id"),
+            [{"id": row.id, "fingerprint": compute_like_fingerprint(row.user_ip, row.user_agent_hash)} for row in rows]
+        )
+        db.session.commit()
+        migrated += len(rows)
+    
+    db.session.execute(text(
+        """
+        DELETE FROM likes a USING likes b
+        WHERE a.submission_id = b.submission_id AND a.fingerprint = b.fingerprint AND a.id > b.id
+        """
+    ))
+    db.session.execute(text("ALTER TABLE likes ALTER COLUMN fingerprint SET NOT NULL"))
+    db.session.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS unique_like_fingerprint ON likes(submission_id, fingerprint)"
+    ))
+    # submission_id 单列索引已被唯一索引前缀覆盖
+    db.session.execute(text("DROP INDEX IF EXISTS idx_likes_submission_id"))
+    db.session.execute(text("DROP INDEX IF EXISTS ix_likes_submission_id"))
+    db.session.execute(text("ALTER TABLE likes DROP COLUMN user_ip, DROP COLUMN user_agent_hash"))
+    db.session.commit()
+    app.logger.info(f"Migrated {migrated} likes to 64-bit fingerprints")
 
 def verify_turnstile(response_token: str, remote_ip: typing.Optional[str] = None) -> bool:
     secret = app.config.get("TURNSTILE_SECRET")
@@ -437,13 +552,35 @@ def ensure_db_initialized_once():
         ensure_schema_migrations()
         setattr(app, _db_initialized_flag_key, True)
 
+def start_background_jobs():
+    """注册本进程的周期后台任务（gunicorn 在每个worker的 post_fork 中调用，开发服务器启动时调用）"""
+    task_manager = get_task_manager(app)
+    task_manager.schedule_periodic(
+        'purge_expired_sessions', purge_expired_sessions,
+        app.config.get('SESSION_PURGE_INTERVAL', 600), app
+    )
+    if app.config.get('LIKE_FILTER_ENABLED', True):
+        # 启动后立即构建点赞过滤器，之后增量刷新
+        task_manager.schedule_periodic(
+            'refresh_like_filter', refresh_like_filter,
+            app.config.get('LIKE_FILTER_REFRESH_INTERVAL', 5), initial_delay=0
+        )
+    # 重新提交延后或丢失的评论审核任务
+    task_manager.schedule_periodic(
+        'requeue_stale_comments', requeue_stale_comments,
+        app.config.get('COMMENT_MODERATION_REQUEUE_INTERVAL', 120), moderate_content,
+        app.config.get('COMMENT_MODERATION_REQUEUE_AFTER', 600),
+        app.config.get('COMMENT_MODERATION_REQUEUE_BATCH', 100)
+    )
+    return task_manager
+
 if __name__ == "__main__":
     with app.app_context():
         db.create_all()
         ensure_schema_migrations()
         
-        # 初始化后台任务管理器，传入app实例
-        task_manager = get_task_manager(app)
+        # 初始化后台任务管理器，传入app实例，并注册周期任务
+        task_manager = start_background_jobs()
         print("后台任务管理器已初始化")
     
     app.run(host="0.0.0.0", port=int(os.getenv("PORT", "9000")), debug=os.getenv("FLASK_DEBUG", "False").lower() == "true")
\ No newline at end of file
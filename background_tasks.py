@@ -44,6 +44,7 @@ class BackgroundTaskManager:
         self.failed_tasks = {}
         self._shutdown = False
         self._worker_thread = None
+        self.periodic_jobs = {}  # job_id -> 调度线程
         self.app = app  # Store Flask app reference
         
         # 启动工作线程
@@ -77,6 +78,31 @@ class BackgroundTaskManager:
         self.task_queue.put(task)
         logger.info(f"任务已提交: {task_id}")
     
+    def schedule_periodic(self, job_id: str, func: Callable, interval: float, *args,
+                          initial_delay: float = None, **kwargs) -> None:
+        """
+        每隔 interval 秒在调度线程中（应用上下文内）直接执行一次 func，不重试，下一周期会再次执行。
+        周期任务不经过任务队列，也不记录到 completed_tasks/failed_tasks。
+        同一 job_id 只注册一次；initial_delay 默认为 interval
+        """
+        if interval <= 0 or job_id in self.periodic_jobs:
+            return
+        delay = interval if initial_delay is None else initial_delay
+
+        def scheduler():
+            time.sleep(delay)
+            while not self._shutdown:
+                try:
+                    self._execute_with_context(func, args, kwargs)
+                except Exception as e:
+                    logger.error(f"周期任务执行失败: {job_id}, 错误: {e}")
+                time.sleep(interval)
+
+        thread = threading.Thread(target=scheduler, name=f"periodic-{job_id}", daemon=True)
+        self.periodic_jobs[job_id] = thread
+        thread.start()
+        logger.info(f"周期任务已注册: {job_id}，间隔 {interval} 秒")
+    
     def _execute_with_context(self, func, args, kwargs):
         """在Flask应用上下文中执行函数"""
         if self.app:
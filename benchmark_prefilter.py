@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+统计本地规则预审能省下多少次模型调用
+对数据库中已有的评价和评论逐条运行 ModerationPrefilterService（不调用接口），
+输出本地放行/本地标记/交给模型的数量与比例，以及单条规则检查的平均耗时。
+使用带人工标注的文件时，同时统计“本地放行但标注不是 ALLOW”的误放行条数；
+只有误放行为 0 时才应开启 MODERATION_PREFILTER_ALLOW_ENABLED
+
+用法:
+    python3 benchmark_prefilter.py                 # 使用数据库中的评价和评论
+    python3 benchmark_prefilter.py --file a.txt    # 使用文本文件，每行一条（按评论审核统计）
+    python3 benchmark_prefilter.py --labelled a.tsv --group content
+                                                   # 标注文件，每行“标注动作<TAB>文本”，统计误放行
+    python3 benchmark_prefilter.py --limit 2000    # 每类最多取 2000 条
+"""
+import sys
+import time
+from collections import Counter
+from app import app
+from models import get_models
+from services.moderation import ModerationService
+from services.moderation_prefilter import ModerationPrefilterService
+
+# 审核类型 -> 对应的提示词和 schema 文件
+GROUP_FILES = {
+    'content': ('Prompt.txt', 'json.txt'),
+    'comment': ('Comment Prompt.txt', 'comment schema.json'),
+}
+
+def arg_value(name, default=None):
+    if name in sys.argv:
+        index = sys.argv.index(name)
+        if index + 1 < len(sys.argv):
+            return sys.argv[index + 1]
+    return default
+
+def load_labelled(path, limit):
+    """读取“标注动作<TAB>文本”格式的文件，返回 [(标注动作, 文本)]"""
+    rows = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            label, sep, text = line.rstrip('\n').partition('\t')
+            if sep and text.strip():
+                rows.append((label.strip().upper(), text.strip()))
+    return rows[:limit]
+
+def load_texts(limit):
+    path = arg_value("--file")
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            return {'comment': [line.strip() for line in f if line.strip()][:limit]}
+
+    models = get_models()
+    Submission, Comment = models['Submission'], models['Comment']
+    return {
+        'content': [row[0] for row in Submission.query.with_entities(Submission.description)
+                    .order_by(Submission.id.desc()).limit(limit)],
+        'comment': [row[0] for row in Comment.query.with_entities(Comment.content)
+                    .order_by(Comment.id.desc()).limit(limit)],
+    }
+
+def main():
+    limit = int(arg_value("--limit", "5000"))
+
+    with app.app_context():
+        app.config['MODERATION_PREFILTER_ENABLED'] = True
+        app.config['MODERATION_PREFILTER_ALLOW_ENABLED'] = True
+
+        labelled = arg_value("--labelled")
+        if labelled:
+            group = arg_value("--group", "comment")
+            _, schema = ModerationService._load_config_files(*GROUP_FILES[group])
+            rows = load_labelled(labelled, limit)
+            false_allows = [
+                (label, text) for label, text in rows
+                if label != 'ALLOW' and (ModerationPrefilterService.check(group, schema, text) or {}).get('action') == 'ALLOW'
+            ]
+            print(f"[{group}] 标注样本 {len(rows)} 条，误放行 {len(false_allows)} 条")
+            for label, text in false_allows:
+                print(f"  {label}\t{text}")
+            sys.exit(1 if false_allows else 0)
+
+        total_calls = total_avoided = 0
+
+        for group, texts in load_texts(limit).items():
+            if not texts:
+                continue
+            _, schema = ModerationService._load_config_files(*GROUP_FILES[group])
+            outcomes = Counter()
+            started = time.perf_counter()
+            for text in texts:
+                result = ModerationPrefilterService.check(group, schema, text)
+                outcomes[result['action'] if result else 'LLM'] += 1
+            elapsed = time.perf_counter() - started
+
+            avoided = len(texts) - outcomes['LLM']
+            total_calls += len(texts)
+            total_avoided += avoided
+            print(f"[{group}] {len(texts)} 条")
+            print(f"  本地放行 ALLOW:         {outcomes['ALLOW']}")
+            print(f"  本地标记 FLAG_AND_FIX:  {outcomes['FLAG_AND_FIX']}")
+            print(f"  交给模型审核:           {outcomes['LLM']}")
+            print(f"  省去的接口调用:         {avoided / len(texts):.1%}")
+            print(f"  平均规则耗时:           {elapsed / len(texts) * 1e6:.0f} µs/条")
+
+        if not total_calls:
+            print("没有可用于统计的文本")
+            return
+        print(f"\n合计省去 {total_avoided}/{total_calls} 次接口调用（{total_avoided / total_calls:.1%}）")
+
+if __name__ == "__main__":
+    main()
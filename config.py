@@ -27,6 +27,14 @@ class Config:
     
     # Session configuration
     PERMANENT_SESSION_LIFETIME = int(os.getenv("PERMANENT_SESSION_LIFETIME", "86400"))  # 24 hours default
+    # Server-side session store: sqlite (local file shared by workers), postgres (UNLOGGED table) or cookie (Flask default).
+    # Unset: postgres when DATABASE_URL is PostgreSQL, otherwise cookie. Expired rows are purged every SESSION_PURGE_INTERVAL seconds
+    SESSION_BACKEND = os.getenv("SESSION_BACKEND", "")
+    SESSION_PURGE_INTERVAL = int(os.getenv("SESSION_PURGE_INTERVAL", "600"))
+    SESSION_SQLITE_PATH = os.getenv(
+        "SESSION_SQLITE_PATH",
+        os.path.abspath(os.path.join(os.path.dirname(__file__), "instance", "sessions.sqlite3")),
+    )
     STRICT_MIME_CHECK = os.getenv("STRICT_MIME_CHECK", "True").lower() in {"1", "true", "yes"}
 
     # Upload directories
@@ -88,6 +96,42 @@ class Config:
     # Rate limiting storage (using memory storage)
     RATELIMIT_STORAGE_URI = os.getenv("RATELIMIT_STORAGE_URI", "memory://")
 
+    # Homepage payload cache (in-process, per worker); 0 disables caching
+    HOMEPAGE_CACHE_TTL = int(os.getenv("HOMEPAGE_CACHE_TTL", "60"))
+    # Site statistics snapshot: refreshed on status changes and in the background once older than this; 0 disables the periodic refresh
+    STATS_REFRESH_INTERVAL = int(os.getenv("STATS_REFRESH_INTERVAL", "300"))
+    # Search keys: fold traditional Chinese to simplified when opencc is installed (rebuild keys after changing)
+    SEARCH_FOLD_TRADITIONAL = os.getenv("SEARCH_FOLD_TRADITIONAL", "True").lower() in {"1", "true", "yes"}
+    # Search result cache (in-process, per worker): TTL for hits and for cached "no result" entries; 0 disables
+    SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "300"))
+    SEARCH_NEGATIVE_CACHE_TTL = int(os.getenv("SEARCH_NEGATIVE_CACHE_TTL", "60"))
+
+    # Maximum submission IDs per batch like-status request (homepage shows at most 60 cards)
+    LIKE_STATUS_BATCH_MAX = int(os.getenv("LIKE_STATUS_BATCH_MAX", "60"))
+    # Key for the 64-bit like fingerprint HMAC (falls back to SECRET_KEY); must be stable across workers and restarts
+    LIKE_FINGERPRINT_KEY = os.getenv("LIKE_FINGERPRINT_KEY")
+    # In-memory Bloom filter of fingerprints that have liked anything (per worker), built at worker start and refreshed
+    # by a background job; likes made in another worker can read as not-liked for up to the refresh interval
+    LIKE_FILTER_ENABLED = os.getenv("LIKE_FILTER_ENABLED", "True").lower() in {"1", "true", "yes"}
+    LIKE_FILTER_REFRESH_INTERVAL = float(os.getenv("LIKE_FILTER_REFRESH_INTERVAL", "5"))
+    LIKE_FILTER_CAPACITY = int(os.getenv("LIKE_FILTER_CAPACITY", "100000"))
+    # Top-level comments per page on the detail page (replies of a page's comments are always included), and the upper bound for ?page_size=
+    COMMENTS_PAGE_SIZE = int(os.getenv("COMMENTS_PAGE_SIZE", "20"))
+    COMMENTS_PAGE_SIZE_MAX = int(os.getenv("COMMENTS_PAGE_SIZE_MAX", "50"))
+    # Reply threads: deepest reply level returned, and at most this many comments per top-level thread (deeper/extra replies are flagged more_replies)
+    COMMENTS_MAX_DEPTH = int(os.getenv("COMMENTS_MAX_DEPTH", "8"))
+    COMMENTS_MAX_SUBTREE = int(os.getenv("COMMENTS_MAX_SUBTREE", "200"))
+    # Background comment moderation: every REQUEUE_INTERVAL seconds, comments still unmoderated REQUEUE_AFTER seconds after
+    # creation (or their last requeue) are queued again, at most REQUEUE_BATCH per run; covers deferred verdicts and lost tasks
+    COMMENT_MODERATION_REQUEUE_INTERVAL = int(os.getenv("COMMENT_MODERATION_REQUEUE_INTERVAL", "120"))
+    COMMENT_MODERATION_REQUEUE_AFTER = int(os.getenv("COMMENT_MODERATION_REQUEUE_AFTER", "600"))
+    COMMENT_MODERATION_REQUEUE_BATCH = int(os.getenv("COMMENT_MODERATION_REQUEUE_BATCH", "100"))
+    # Rendered detail page fragment cache (in-process, per worker); 0 disables
+    DETAIL_CACHE_TTL = int(os.getenv("DETAIL_CACHE_TTL", "300"))
+    # Signed detail-page access tokens in homepage/search links: lifetime, and expiry rounding so links stay cacheable
+    DETAIL_TOKEN_TTL = int(os.getenv("DETAIL_TOKEN_TTL", "1800"))
+    DETAIL_TOKEN_BUCKET = int(os.getenv("DETAIL_TOKEN_BUCKET", "300"))
+
     # Privacy protection settings
     THUMBNAIL_SIZE = (300, 300)  # Maximum thumbnail dimensions
     THUMBNAIL_QUALITY = 75  # JPEG quality for thumbnails
@@ -101,3 +145,39 @@ class Config:
     OPENAI_CLEAR_PROXIES = os.getenv("OPENAI_CLEAR_PROXIES", "False").lower() in {"1", "true", "yes"}
     OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # Optional: custom endpoint
     OPENAI_USE_CUSTOM_HTTP_CLIENT = os.getenv("OPENAI_USE_CUSTOM_HTTP_CLIENT", "False").lower() in {"1", "true", "yes"}
+    # Shared per-process OpenAI client: concurrent in-flight calls (also the keep-alive pool size), idle connection lifetime,
+    # seconds to wait for a free slot, and HTTP/2 (used only when the optional h2 package is installed).
+    # OPENAI_CLEAR_PROXIES ignores HTTP(S)_PROXY env vars; OPENAI_USE_CUSTOM_HTTP_CLIENT uses a plain httpx client instead of the SDK default
+    OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+    OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "60"))
+    OPENAI_SLOT_TIMEOUT = float(os.getenv("OPENAI_SLOT_TIMEOUT", "10"))
+    OPENAI_HTTP2 = os.getenv("OPENAI_HTTP2", "True").lower() in {"1", "true", "yes"}
+    # Moderation verdict cache keyed by (prompt version, schema version, SHA-256 of text):
+    # in-process LRU tier (seconds) in front of the shared moderation_cache table (days)
+    MODERATION_CACHE_ENABLED = os.getenv("MODERATION_CACHE_ENABLED", "True").lower() in {"1", "true", "yes"}
+    MODERATION_CACHE_TTL = int(os.getenv("MODERATION_CACHE_TTL", "3600"))
+    MODERATION_CACHE_DB_TTL_DAYS = int(os.getenv("MODERATION_CACHE_DB_TTL_DAYS", "30"))
+    # Micro-batching: concurrent moderation requests arriving within the window are sent as one multi-item call.
+    # Off by default: sync gunicorn workers serve one request at a time, so only enable with threaded/gevent workers
+    MODERATION_BATCH_ENABLED = os.getenv("MODERATION_BATCH_ENABLED", "False").lower() in {"1", "true", "yes"}
+    MODERATION_BATCH_WINDOW_MS = int(os.getenv("MODERATION_BATCH_WINDOW_MS", "50"))
+    MODERATION_BATCH_MAX_ITEMS = int(os.getenv("MODERATION_BATCH_MAX_ITEMS", "8"))
+    # Local rule pre-filter: definite PII is flagged without an API call. The local ALLOW (short text made only of a fixed
+    # PII-free vocabulary, at most ALLOW_MAX_CHARS) has its own switch. Both are off by default; only enable the ALLOW once
+    # benchmark_prefilter.py --labelled reports zero false ALLOWs on real labelled data
+    MODERATION_PREFILTER_ENABLED = os.getenv("MODERATION_PREFILTER_ENABLED", "False").lower() in {"1", "true", "yes"}
+    MODERATION_PREFILTER_ALLOW_ENABLED = os.getenv("MODERATION_PREFILTER_ALLOW_ENABLED", "False").lower() in {"1", "true", "yes"}
+    MODERATION_PREFILTER_ALLOW_MAX_CHARS = int(os.getenv("MODERATION_PREFILTER_ALLOW_MAX_CHARS", "60"))
+    # Circuit breaker around moderation API calls (per process): opens when, over the last WINDOW calls (at least MIN_CALLS),
+    # the failure rate or the rate of calls slower than SLOW_SECONDS reaches its threshold; probes again after OPEN_SECONDS.
+    # MODERATION_DEGRADED_MODE: "pending" (leave comments for moderate_pending_comments.py, flag submissions) or "allow"
+    MODERATION_BREAKER_ENABLED = os.getenv("MODERATION_BREAKER_ENABLED", "True").lower() in {"1", "true", "yes"}
+    MODERATION_BREAKER_WINDOW = int(os.getenv("MODERATION_BREAKER_WINDOW", "20"))
+    MODERATION_BREAKER_MIN_CALLS = int(os.getenv("MODERATION_BREAKER_MIN_CALLS", "4"))
+    MODERATION_BREAKER_FAILURE_RATE = float(os.getenv("MODERATION_BREAKER_FAILURE_RATE", "0.5"))
+    MODERATION_BREAKER_SLOW_SECONDS = float(os.getenv("MODERATION_BREAKER_SLOW_SECONDS", "15"))
+    MODERATION_BREAKER_SLOW_RATE = float(os.getenv("MODERATION_BREAKER_SLOW_RATE", "0.8"))
+    MODERATION_BREAKER_OPEN_SECONDS = float(os.getenv("MODERATION_BREAKER_OPEN_SECONDS", "30"))
+    MODERATION_DEGRADED_MODE = os.getenv("MODERATION_DEGRADED_MODE", "pending").lower()
+    # Automatic SDK retries per moderation call (the SDK default of 2 triples worst-case latency)
+    OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "0"))
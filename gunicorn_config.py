@@ -41,6 +41,14 @@ def post_fork(server, worker):
     except Exception as e:
         server.log.error(f"Worker {worker.pid}: Error initializing database connections: {e}")
 
+    # Periodic background jobs (session purge etc.) run in every worker
+    try:
+        from app import start_background_jobs
+        start_background_jobs()
+        server.log.info(f"Worker {worker.pid}: Background jobs scheduled")
+    except Exception as e:
+        server.log.error(f"Worker {worker.pid}: Error scheduling background jobs: {e}")
+
 def pre_fork(server, worker):
     """Called before worker processes are forked"""
     server.log.info(f"About to fork worker {worker}")
@@ -20,12 +20,18 @@ def init_models(database_instance):
     from .evidence import create_evidence_model
     from .appeal import create_appeal_models
     from .interaction import create_interaction_models
+    from .stats import create_stats_model
+    from .search import create_search_models
+    from .moderation import create_moderation_models
     
     # Create model classes
     Submission = create_submission_model(database_instance)
     Evidence = create_evidence_model(database_instance)
     Appeal, AppealEvidence = create_appeal_models(database_instance)
     Like, Comment = create_interaction_models(database_instance)
+    SiteStats = create_stats_model(database_instance)
+    SubmissionSearchKey = create_search_models(database_instance)
+    ModerationCacheEntry = create_moderation_models(database_instance)
     
     # Cache and return all model classes and utilities
     _initialized_models = {
@@ -36,14 +42,24 @@ def init_models(database_instance):
         'AppealEvidence': AppealEvidence,
         'Like': Like,
         'Comment': Comment,
+        'SiteStats': SiteStats,
+        'SubmissionSearchKey': SubmissionSearchKey,
+        'ModerationCacheEntry': ModerationCacheEntry,
         'mask_name': mask_name
     }
     
     return _initialized_models
 
+def get_models():
+    """Return the model classes registered by init_models (for services outside the route globals)"""
+    if _initialized_models is None:
+        raise RuntimeError("Models have not been initialized, call init_models(db) first")
+    return _initialized_models
+
 # Convenience imports (will be available after init_models is called)
 __all__ = [
     'init_models',
+    'get_models',
     'ReviewStatus',
     'Submission', 
     'Evidence',
@@ -51,5 +67,8 @@ __all__ = [
     'AppealEvidence',
     'Like',
     'Comment',
+    'SiteStats',
+    'SubmissionSearchKey',
+    'ModerationCacheEntry',
     'mask_name'
 ]
\ No newline at end of file
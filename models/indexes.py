@@ -0,0 +1,67 @@
+"""
+Hot-query index set for NYU CLASS Professor Review System
+
+This module lists the composite / partial / functional PostgreSQL indexes
+that serve the public hot queries, and applies them idempotently from
+ensure_schema_migrations(). test_query_plans.py checks with EXPLAIN that
+every hot query is served by one of them instead of a sequential scan.
+"""
+
+from sqlalchemy import text
+
+# (index name, CREATE INDEX statement)
+HOT_QUERY_INDEXES = [
+    # 首页精选：status='approved' AND privacy_homepage IS TRUE ORDER BY updated_at DESC, id DESC（含keyset分页）
+    (
+        "idx_submissions_homepage_feed",
+        "CREATE INDEX IF NOT EXISTS idx_submissions_homepage_feed "
+        "ON submissions (updated_at DESC, id DESC) "
+        "WHERE status = 'approved' AND privacy_homepage IS TRUE",
+    ),
+    # 站点统计：已通过记录的 COUNT / MAX(updated_at)
+    (
+        "idx_submissions_approved_updated_at",
+        "CREATE INDEX IF NOT EXISTS idx_submissions_approved_updated_at "
+        "ON submissions (updated_at DESC) "
+        "WHERE status = 'approved'",
+    ),
+    # 公开评论：submission_id + 已通过 + 未删除，按 created_at 排序
+    (
+        "idx_comments_visible_by_submission",
+        "CREATE INDEX IF NOT EXISTS idx_comments_visible_by_submission "
+        "ON comments (submission_id, created_at, id) "
+        "WHERE status = 'approved' AND deleted = FALSE",
+    ),
+    # 评论分页：顶级评论（任意状态，不可见但有回复的作为占位）按 (created_at, id) keyset分页
+    (
+        "idx_comments_roots_by_submission",
+        "CREATE INDEX IF NOT EXISTS idx_comments_roots_by_submission "
+        "ON comments (submission_id, created_at, id) "
+        "WHERE parent_id IS NULL",
+    ),
+    # 评论发布频率检查：user_ip = ? AND created_at > now() - 1 min（在守卫INSERT中执行）
+    (
+        "idx_comments_user_ip_created_at",
+        "CREATE INDEX IF NOT EXISTS idx_comments_user_ip_created_at "
+        "ON comments (user_ip, created_at)",
+    ),
+]
+
+
+# 已被替代的索引：首页搜索改为查 submission_search_keys.search_key（见 services/search.py）
+RETIRED_INDEXES = [
+    "idx_submissions_lower_cn_name",
+    "idx_submissions_lower_en_name",
+    "idx_submissions_lower_unique_identifier",
+    # 评论 user_ip 单列索引，由 idx_comments_user_ip_created_at 的前缀覆盖
+    "idx_comments_user_ip",
+    "ix_comments_user_ip",
+]
+
+
+def ensure_hot_query_indexes(db):
+    """创建缺失的热点查询索引并删除已废弃的索引（幂等，由调用方提交事务）"""
+    for _name, ddl in HOT_QUERY_INDEXES:
+        db.session.execute(text(ddl))
+    for name in RETIRED_INDEXES:
+        db.session.execute(text(f"DROP INDEX IF EXISTS {name}"))
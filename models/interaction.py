@@ -13,14 +13,15 @@ def create_interaction_models(db):
         __tablename__ = "likes"
 
         id = db.Column(db.Integer, primary_key=True)
+        # submission_id 的查询由下面唯一索引的前缀覆盖，不再单独建索引
         submission_id = db.Column(
-            db.Integer, db.ForeignKey("submissions.id", ondelete="CASCADE"), nullable=False, index=True
+            db.Integer, db.ForeignKey("submissions.id", ondelete="CASCADE"), nullable=False
         )
-        user_ip = db.Column(db.String(45), nullable=False, index=True)  # IPv4/IPv6 address
-        user_agent_hash = db.Column(db.String(64), nullable=False)  # MD5 hash of user agent for additional uniqueness
+        # 64位带密钥哈希：HMAC(IP + User-Agent MD5)，见 utils.security.compute_like_fingerprint
+        fingerprint = db.Column(db.BigInteger, nullable=False)
         created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
         
-        __table_args__ = (db.UniqueConstraint('submission_id', 'user_ip', 'user_agent_hash', name='unique_like_per_user'),)
+        __table_args__ = (db.UniqueConstraint('submission_id', 'fingerprint', name='unique_like_fingerprint'),)
 
     class Comment(db.Model):
         __tablename__ = "comments"
@@ -35,7 +36,10 @@ def create_interaction_models(db):
         status = db.Column(db.String(32), default="pending", nullable=False, index=True)  # pending, approved, rejected
         client_notice = db.Column(db.Text, nullable=True)
         deleted = db.Column(db.Boolean, default=False, nullable=False, index=True)  # 软删除标记
-        user_ip = db.Column(db.String(45), nullable=True, index=True)  # 用户IP地址，支持IPv6
+        moderated_at = db.Column(db.DateTime, nullable=True)  # 后台审核完成时间，NULL表示尚未审核
+        moderation_requeued_at = db.Column(db.DateTime, nullable=True)  # 最近一次被周期任务重新入队的时间
+        # 用户IP地址，支持IPv6；频率检查由 (user_ip, created_at) 复合索引覆盖（见 models/indexes.py）
+        user_ip = db.Column(db.String(45), nullable=True)
         
         # 关系定义
         parent = db.relationship("Comment", remote_side=[id], backref=db.backref("replies", cascade="all, delete-orphan"))
@@ -0,0 +1,28 @@
+"""
+Moderation cache model for NYU CLASS Professor Review System
+
+This module contains the ModerationCacheEntry model: one stored moderation
+verdict per (content hash, prompt version, schema version), shared by all
+gunicorn workers so identical text is sent to the moderation API only once.
+"""
+
+from datetime import datetime
+
+def create_moderation_models(db):
+    """Create and return ModerationCacheEntry model class"""
+    
+    class ModerationCacheEntry(db.Model):
+        __tablename__ = "moderation_cache"
+
+        id = db.Column(db.Integer, primary_key=True)
+        content_hash = db.Column(db.String(64), nullable=False)  # 清理后文本的 SHA-256
+        prompt_version = db.Column(db.String(16), nullable=False)  # 提示词（含模型名）的哈希前缀
+        schema_version = db.Column(db.String(16), nullable=False)  # 输出schema的哈希前缀
+        result = db.Column(db.Text, nullable=False)  # 审核结果JSON
+        created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+        
+        __table_args__ = (
+            db.UniqueConstraint('content_hash', 'prompt_version', 'schema_version', name='unique_moderation_cache_key'),
+        )
+    
+    return ModerationCacheEntry
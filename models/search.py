@@ -0,0 +1,24 @@
+"""
+Search key model for NYU CLASS Professor Review System
+
+This module contains the SubmissionSearchKey model: one normalized lookup
+key per identity field (cn_name, en_name, unique_identifier) of a submission,
+so that homepage exact-match search is a single index probe.
+"""
+
+def create_search_models(db):
+    """Create and return SubmissionSearchKey model class"""
+    
+    class SubmissionSearchKey(db.Model):
+        __tablename__ = "submission_search_keys"
+
+        id = db.Column(db.Integer, primary_key=True)
+        submission_id = db.Column(
+            db.Integer, db.ForeignKey("submissions.id", ondelete="CASCADE"), nullable=False, index=True
+        )
+        field = db.Column(db.String(32), nullable=False)  # cn_name / en_name / unique_identifier
+        search_key = db.Column(db.String(255), nullable=False, index=True)  # 归一化后的查找键
+        
+        __table_args__ = (db.UniqueConstraint('submission_id', 'field', name='unique_search_key_per_field'),)
+    
+    return SubmissionSearchKey
@@ -0,0 +1,26 @@
+"""
+Site statistics model for NYU CLASS Professor Review System
+
+This module contains the SiteStats snapshot model that stores precomputed
+site-wide aggregates (approved totals, last update time, pending appeals)
+and the shared content version used to invalidate per-worker caches.
+"""
+
+from datetime import datetime
+
+def create_stats_model(db):
+    """Create and return SiteStats model class"""
+    
+    class SiteStats(db.Model):
+        __tablename__ = "site_stats"
+
+        # 单行快照表，始终使用 id=1
+        id = db.Column(db.Integer, primary_key=True)
+        approved_count = db.Column(db.Integer, default=0, nullable=False)  # 已通过的提交总数
+        homepage_count = db.Column(db.Integer, default=0, nullable=False)  # 已通过且展示在首页的提交数
+        pending_appeals_count = db.Column(db.Integer, default=0, nullable=False)  # 待处理申诉数
+        last_updated = db.Column(db.DateTime, nullable=True)  # 已通过提交的最近更新时间（UTC）
+        refreshed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)  # 快照刷新时间
+        content_version = db.Column(db.Integer, default=0, nullable=False)  # 公开内容版本号，各worker的首页/搜索缓存键包含此值
+    
+    return SiteStats
@@ -72,6 +72,10 @@ def create_submission_model(db):
         
         # 点赞计数缓存字段
         like_count = db.Column(db.Integer, default=0, nullable=False)
+        # 评论计数缓存字段（已通过且未删除的评论），由 services.counters 增量维护
+        comment_count = db.Column(db.Integer, default=0, nullable=False)
+        # 可见评论的变更版本号：评论通过/删除时递增，用作评论接口的ETag
+        comments_version = db.Column(db.Integer, default=0, nullable=False)
 
         def get_display_name(self, masked: bool = False) -> str:
             base = self.professor_cn_name or self.professor_en_name or self.professor_unique_identifier or "未知"
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+补审尚未完成后台审核的评论
+评论审核任务保存在进程内存队列中，进程重启或任务最终失败时会遗留未审核的评论。
+运行中的服务会由周期任务自动重新入队（见 COMMENT_MODERATION_REQUEUE_*）；
+此脚本用于立即逐条同步审核并写回结果（已审核过的评论会被跳过，可重复执行）
+
+用法:
+    python3 moderate_pending_comments.py            # 审核所有遗留评论
+    python3 moderate_pending_comments.py --dry-run  # 只列出待审核的评论ID
+"""
+import sys
+from app import app
+from services.comment_moderation import CommentModerationService, moderate_pending_comment
+from services.moderation import moderate_content
+
+def main():
+    dry_run = "--dry-run" in sys.argv
+
+    with app.app_context():
+        comment_ids = CommentModerationService.pending_ids()
+        if not comment_ids:
+            print("✅ 没有待审核的评论")
+            return
+
+        if dry_run:
+            print(f"发现 {len(comment_ids)} 条待审核评论（dry-run，未审核）: {comment_ids}")
+            return
+
+        for comment_id in comment_ids:
+            status = moderate_pending_comment(comment_id, moderate_content)
+            print(f"  comment {comment_id}: {status}")
+
+        print(f"\n🎉 已审核 {len(comment_ids)} 条评论")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+"""
+重建 submission_search_keys 表中的归一化查找键
+查找键在提交、管理员修改时增量维护，此脚本用于部署后初始化、
+安装/卸载 opencc 或修改 SEARCH_FOLD_TRADITIONAL 之后重新生成
+
+用法:
+    python3 rebuild_search_keys.py
+"""
+from app import app
+from services.search import rebuild_search_keys
+
+def main():
+    with app.app_context():
+        processed = rebuild_search_keys()
+        print(f"🎉 已为 {processed} 条提交记录重建查找键")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+校正 submissions 表中的点赞数/评论数缓存列
+计数在点赞、评论、删除时增量维护，此脚本用于部署后初始化或发现偏差时修复
+
+用法:
+    python3 reconcile_counters.py             # 校正 like_count 和 comment_count
+    python3 reconcile_counters.py --dry-run   # 只列出偏差，不写入
+    python3 reconcile_counters.py --skip-likes  # 保留管理员手动调整的点赞数
+"""
+import sys
+from app import app
+from services.counters import reconcile_counters
+
+def main():
+    dry_run = "--dry-run" in sys.argv
+    skip_likes = "--skip-likes" in sys.argv
+
+    with app.app_context():
+        drift = reconcile_counters(likes=not skip_likes, comments=True, dry_run=dry_run)
+
+        if not drift:
+            print("✅ 所有计数均与实际数据一致")
+            return
+
+        for submission_id, field, cached, actual in drift:
+            print(f"  submission {submission_id}: {field} {cached} -> {actual}")
+
+        if dry_run:
+            print(f"\n发现 {len(drift)} 处偏差（dry-run，未写入）")
+        else:
+            print(f"\n🎉 已校正 {len(drift)} 处偏差")
+
+if __name__ == "__main__":
+    main()
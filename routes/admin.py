@@ -14,6 +14,9 @@ from sqlalchemy import or_
 from utils.decorators import rate_limit, admin_required
 from utils.security import sanitize_html
 from utils.email_sender import send_html_email
+from services.homepage import invalidate_homepage_cache
+from services.stats import get_site_stats, refresh_site_stats
+from services.search import sync_search_keys, search_cache_keys, invalidate_search_cache
 
 # This will be set by the main app
 db = None
@@ -39,6 +42,9 @@ def admin_login():
     
     # Check password using hash verification
     if check_password_hash(current_app.config["ADMIN_PASSWORD"], password):
+        # 登录后更换会话ID，防止会话固定
+        if hasattr(session, "regenerate"):
+            session.regenerate()
         session["is_admin"] = True
         session.permanent = True
         next_page = request.args.get("next")
@@ -74,8 +80,8 @@ def admin_dashboard():
         )
     submissions = q.order_by(Submission.created_at.desc()).limit(200).all()
     
-    # 获取待处理申诉数量
-    pending_appeals_count = Appeal.query.filter(Appeal.status == "pending").count()
+    # 获取待处理申诉数量（读取统计快照）
+    pending_appeals_count = get_site_stats()['pending_appeals_count']
     
     return render_template("admin/dashboard.html", submissions=submissions, ReviewStatus=ReviewStatus, pending_appeals_count=pending_appeals_count)
 
@@ -93,6 +99,8 @@ def admin_submission_action(submission_id: int):
     sub = Submission.query.get_or_404(submission_id)
     action = request.form.get("action")
     note = (request.form.get("note") or "").strip() or None
+    # 修改前的查找键：改名或状态变化后，旧键和新键的缓存结果都要失效
+    stale_search_keys = search_cache_keys(sub)
 
     if action == "approve":
         sub.status = ReviewStatus.APPROVED
@@ -106,6 +114,9 @@ def admin_submission_action(submission_id: int):
     elif action == "delete":
         db.session.delete(sub)
         db.session.commit()
+        invalidate_homepage_cache()
+        invalidate_search_cache(stale_search_keys)
+        refresh_site_stats()
         flash("已删除", "success")
         return redirect(url_for("admin.admin_dashboard"))
     elif action == "flag_toggle":
@@ -116,6 +127,7 @@ def admin_submission_action(submission_id: int):
         sub.professor_en_name = (request.form.get("professor_en_name") or "").strip() or None
         sub.professor_unique_identifier = (request.form.get("professor_unique_identifier") or "").strip() or None
         sub.professor_birthday = (request.form.get("professor_birthday") or "").strip() or None
+        sync_search_keys(sub)
         sub.description = sanitize_html((request.form.get("description") or "").strip())
         sub.tag_positive = bool(request.form.get("tag_positive"))
         sub.tag_calm = bool(request.form.get("tag_calm"))
@@ -147,6 +159,9 @@ def admin_submission_action(submission_id: int):
     try:
         db.session.commit()
         current_app.logger.info(f"Database committed for submission {submission_id}, status: {sub.status}")
+        invalidate_homepage_cache()
+        invalidate_search_cache(stale_search_keys | search_cache_keys(sub))
+        refresh_site_stats()
         
         # 重新查询以验证状态确实已更新
         sub_verified = Submission.query.get(submission_id)
@@ -244,6 +259,7 @@ def admin_appeal_action(appeal_id: int):
     elif action == "delete":
         db.session.delete(ap)
         db.session.commit()
+        refresh_site_stats()
         flash("申诉已删除", "success")
         return redirect(url_for("admin.admin_appeals"))
     else:
@@ -253,6 +269,7 @@ def admin_appeal_action(appeal_id: int):
     if note is not None:
         ap.admin_notes = note
     db.session.commit()
+    refresh_site_stats()
     
     # 发送申诉处理结果邮件通知
     if action in ["resolve", "reject"] and ap.email:
@@ -361,6 +378,9 @@ def admin_bulk_action():
             return jsonify({"success": False, "message": "部分提交不存在"}), 400
         
         processed_count = 0
+        stale_search_keys = set()
+        for submission in submissions:
+            stale_search_keys |= search_cache_keys(submission)
         
         # 执行批量操作
         for submission in submissions:
@@ -396,6 +416,9 @@ def admin_bulk_action():
         
         # 提交数据库更改
         db.session.commit()
+        invalidate_homepage_cache()
+        invalidate_search_cache(stale_search_keys)
+        refresh_site_stats()
         
         # 验证批量操作是否成功
         if action in ["approve", "reject"]:
@@ -471,7 +494,15 @@ def admin_seed():
         ),
     ]
     db.session.add_all(samples)
+    db.session.flush()
+    new_search_keys = set()
+    for sample in samples:
+        sync_search_keys(sample)
+        new_search_keys |= search_cache_keys(sample)
     db.session.commit()
+    invalidate_homepage_cache()
+    invalidate_search_cache(new_search_keys)
+    refresh_site_stats()
     flash("已生成测试数据", "success")
     return redirect(url_for("admin.admin_dashboard"))
 
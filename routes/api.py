@@ -6,12 +6,20 @@ This module contains all API endpoints including likes, comments, and admin API
 
 import hashlib
 import time
-from datetime import datetime, timedelta
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, url_for
 # CSRF will be handled by the main app's csrf.exempt decorator
 from sqlalchemy import func
 from utils.decorators import admin_required, rate_limit
-from utils.security import sanitize_html
+from utils.security import (
+    sanitize_html, compute_like_fingerprint, generate_comment_status_token, verify_comment_status_token
+)
+from services.counters import adjust_counters
+from services.likes import toggle_submission_like, has_liked, get_like_statuses
+from services.comment_moderation import enqueue_comment_moderation, get_comment_moderation_status
+from services.comments import (
+    get_comment_page, get_admin_comment_tree, comment_page_size, insert_comment,
+    REASON_SUBMISSION_NOT_FOUND, REASON_PARENT_NOT_FOUND
+)
 
 # This will be set by the main app
 db = None
@@ -25,53 +33,40 @@ moderate_content = None
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
 def get_user_fingerprint(request):
-    """生成用户指纹用于点赞去重"""
+    """生成用户指纹用于点赞去重（64位带密钥哈希，存储为BIGINT）"""
     user_ip = request.headers.get("CF-Connecting-IP") or request.remote_addr or "unknown"
     user_agent = request.headers.get("User-Agent", "")
     user_agent_hash = hashlib.md5(user_agent.encode('utf-8')).hexdigest()
-    return user_ip, user_agent_hash
+    return compute_like_fingerprint(user_ip, user_agent_hash)
+
+def not_modified(etag: str, cache_control: str):
+    """客户端携带的 If-None-Match 与当前版本一致时返回304响应，否则返回None"""
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = current_app.response_class(status=304)
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = cache_control
+    return response
+
+def with_etag(response, etag: str, cache_control: str):
+    """为响应附加弱ETag和缓存策略（no-cache：可缓存但每次需要向服务器验证）"""
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = cache_control
+    return response
 
 @api_bp.route("/like/<int:submission_id>", methods=["POST"])
 @rate_limit(limit=10, window=60)  # 10 per minute
 def toggle_like(submission_id: int):
     """切换点赞状态"""
     try:
-        # 检查提交是否存在且已审核通过
-        submission = Submission.query.filter_by(id=submission_id, status=ReviewStatus.APPROVED).first()
-        if not submission:
-            return jsonify({"error": "记录不存在或未审核通过"}), 404
-        
         # 获取用户指纹
-        user_ip, user_agent_hash = get_user_fingerprint(request)
-        
-        # 检查是否已经点赞
-        existing_like = Like.query.filter_by(
-            submission_id=submission_id,
-            user_ip=user_ip,
-            user_agent_hash=user_agent_hash
-        ).first()
-        
-        if existing_like:
-            # 取消点赞
-            db.session.delete(existing_like)
-            liked = False
-        else:
-            # 添加点赞
-            new_like = Like(
-                submission_id=submission_id,
-                user_ip=user_ip,
-                user_agent_hash=user_agent_hash
-            )
-            db.session.add(new_like)
-            liked = True
+        fingerprint = get_user_fingerprint(request)
         
-        db.session.commit()
-        
-        # 更新缓存的点赞数
-        submission.update_like_count()
-        
-        # 返回最新的点赞数
-        like_count = submission.like_count
+        # 删除/插入点赞与计数更新在同一事务中完成，只提交一次
+        result = toggle_submission_like(submission_id, fingerprint)
+        if result is None:
+            return jsonify({"error": "记录不存在或未审核通过"}), 404
+        liked, like_count = result
         
         return jsonify({
             "liked": liked,
@@ -89,73 +84,134 @@ def get_like_status(submission_id: int):
     """获取用户对特定提交的点赞状态"""
     try:
         # 检查提交是否存在且已审核通过
-        submission = Submission.query.filter_by(id=submission_id, status=ReviewStatus.APPROVED).first()
-        if not submission:
+        like_count = db.session.query(Submission.like_count).filter_by(
+            id=submission_id, status=ReviewStatus.APPROVED
+        ).scalar()
+        if like_count is None:
             return jsonify({"error": "记录不存在或未审核通过"}), 404
         
         # 获取用户指纹
-        user_ip, user_agent_hash = get_user_fingerprint(request)
+        fingerprint = get_user_fingerprint(request)
         
-        # 检查用户是否已经点赞
-        existing_like = Like.query.filter_by(
-            submission_id=submission_id,
-            user_ip=user_ip,
-            user_agent_hash=user_agent_hash
-        ).first()
+        # 检查用户是否已经点赞（从未点过赞的指纹由内存过滤器直接判定）
+        liked = has_liked(submission_id, fingerprint)
         
-        return jsonify({
-            "liked": existing_like is not None,
-            "like_count": submission.like_count
-        })
+        # 响应只取决于 (like_count, liked)，按用户区分缓存
+        etag = f"like-{submission_id}-{like_count}-{int(liked)}"
+        cached = not_modified(etag, "private, no-cache")
+        if cached is not None:
+            return cached
+        
+        return with_etag(jsonify({
+            "liked": liked,
+            "like_count": like_count
+        }), etag, "private, no-cache")
         
     except Exception as e:
         current_app.logger.error(f"获取点赞状态失败: {e}")
         return jsonify({"error": "操作失败"}), 500
 
+@api_bp.route("/like-status", methods=["GET"])
+@rate_limit(limit=30, window=60)  # 30 per minute
+def get_like_status_batch():
+    """批量获取点赞状态：?ids=1,2,3，最多 LIKE_STATUS_BATCH_MAX 个，一次查询返回"""
+    raw_ids = (request.args.get("ids") or "").strip()
+    try:
+        submission_ids = list(dict.fromkeys(int(x) for x in raw_ids.split(",") if x.strip()))
+    except ValueError:
+        return jsonify({"error": "无效的ID列表"}), 400
+    if not submission_ids:
+        return jsonify({"error": "缺少ID列表"}), 400
+    max_ids = current_app.config.get("LIKE_STATUS_BATCH_MAX", 60)
+    if len(submission_ids) > max_ids:
+        return jsonify({"error": f"一次最多查询{max_ids}条记录"}), 400
+    
+    try:
+        fingerprint = get_user_fingerprint(request)
+        items = get_like_statuses(submission_ids, fingerprint)
+        
+        versions = sorted((item["id"], item["like_count"], item["liked"]) for item in items)
+        etag = "likes-" + hashlib.md5(repr(versions).encode("utf-8")).hexdigest()
+        cached = not_modified(etag, "private, no-cache")
+        if cached is not None:
+            return cached
+        
+        return with_etag(jsonify({"items": items}), etag, "private, no-cache")
+        
+    except Exception as e:
+        current_app.logger.error(f"批量获取点赞状态失败: {e}")
+        return jsonify({"error": "操作失败"}), 500
+
 @api_bp.route("/comments/<int:submission_id>", methods=["GET"])
 @rate_limit(limit=60, window=60)  # 60 per minute  
 def get_comments(submission_id: int):
-    """获取评论"""
+    """获取一页评论：?cursor=...&page_size=N，按 (created_at, id) 游标分页顶级评论"""
+    cursor = (request.args.get("cursor") or "").strip() or None
+    page_size = comment_page_size(request.args.get("page_size"))
     try:
-        # 检查提交是否存在且已审核通过
-        submission = Submission.query.filter_by(id=submission_id, status=ReviewStatus.APPROVED).first()
-        if not submission:
+        # 检查提交是否存在且已审核通过，同时读取评论版本号和评论总数
+        row = db.session.query(Submission.comments_version, Submission.comment_count).filter_by(
+            id=submission_id, status=ReviewStatus.APPROVED
+        ).first()
+        if row is None:
             return jsonify({"error": "记录不存在或未审核通过"}), 404
         
-        # 获取已通过审核且未删除的评论
-        comments = Comment.query.filter_by(
-            submission_id=submission_id,
-            status="approved",
-            deleted=False
-        ).order_by(Comment.created_at.asc()).all()
-        
-        # 构建评论树
-        comment_dict = {}
-        root_comments = []
-        
-        for comment in comments:
-            comment_data = {
-                "id": comment.id,
-                "content": comment.content,
-                "created_at": comment.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-                "replies": []
-            }
-            comment_dict[comment.id] = comment_data
-            
-            if comment.parent_id is None:
-                root_comments.append(comment_data)
-            elif comment.parent_id in comment_dict:
-                comment_dict[comment.parent_id]["replies"].append(comment_data)
+        # 评论未变化时直接返回304，不读取评论行
+        etag = f"comments-{submission_id}-{row.comments_version}-{page_size}-{cursor or ''}"
+        cached = not_modified(etag, "no-cache")
+        if cached is not None:
+            return cached
         
-        return jsonify({
-            "comments": root_comments,
-            "total": len(comments)
-        })
+        page = get_comment_page(submission_id, cursor, page_size)
+        
+        return with_etag(jsonify({
+            "comments": page["comments"],
+            "next_cursor": page["next_cursor"],
+            "has_more": page["has_more"],
+            "total": row.comment_count
+        }), etag, "no-cache")
         
+    except ValueError:
+        return jsonify({"error": "无效的分页参数"}), 400
     except Exception as e:
         current_app.logger.error(f"获取评论失败: {e}")
         return jsonify({"error": "操作失败"}), 500
 
+@api_bp.route("/detail-bootstrap/<int:submission_id>", methods=["GET"])
+@rate_limit(limit=60, window=60)  # 60 per minute
+def get_detail_bootstrap(submission_id: int):
+    """详情页初始化数据：点赞状态、点赞数和第一页评论合并为一次请求、一次提交记录检查"""
+    try:
+        row = db.session.query(
+            Submission.like_count, Submission.comment_count, Submission.comments_version
+        ).filter_by(id=submission_id, status=ReviewStatus.APPROVED).first()
+        if row is None:
+            return jsonify({"error": "记录不存在或未审核通过"}), 404
+        
+        fingerprint = get_user_fingerprint(request)
+        liked = has_liked(submission_id, fingerprint)
+        page_size = comment_page_size(None)
+        
+        etag = f"detail-{submission_id}-{row.like_count}-{int(liked)}-{row.comments_version}-{page_size}"
+        cached = not_modified(etag, "private, no-cache")
+        if cached is not None:
+            return cached
+        
+        page = get_comment_page(submission_id, None, page_size)
+        
+        return with_etag(jsonify({
+            "liked": liked,
+            "like_count": row.like_count,
+            "comments": page["comments"],
+            "next_cursor": page["next_cursor"],
+            "has_more": page["has_more"],
+            "total": row.comment_count
+        }), etag, "private, no-cache")
+        
+    except Exception as e:
+        current_app.logger.error(f"获取详情页数据失败: {e}")
+        return jsonify({"error": "操作失败"}), 500
+
 @api_bp.route("/comments", methods=["POST"])
 def submit_comment():
     """提交评论"""
@@ -172,67 +228,79 @@ def submit_comment():
         if len(content) > 500:
             return jsonify({"error": "评论内容过长"}), 400
         
-        # 检查提交是否存在且已审核通过
-        submission = Submission.query.filter_by(id=submission_id, status=ReviewStatus.APPROVED).first()
-        if not submission:
-            return jsonify({"error": "记录不存在或未审核通过"}), 404
-        
-        # 检查父评论是否存在（如果是回复）
-        if parent_id:
-            parent_comment = Comment.query.filter_by(id=parent_id, submission_id=submission_id, deleted=False).first()
-            if not parent_comment:
-                return jsonify({"error": "父评论不存在"}), 404
-        
         # 获取用户IP
         user_ip = request.headers.get("CF-Connecting-IP") or request.remote_addr or "unknown"
         
-        # 速率限制：每IP每分钟最多3条评论
-        recent_comments = Comment.query.filter(
-            Comment.user_ip == user_ip,
-            Comment.created_at > datetime.utcnow() - timedelta(minutes=1)
-        ).count()
-        
-        if recent_comments >= 3:
-            return jsonify({"error": "评论过于频繁，请稍后再试"}), 429
-        
         # 清理HTML内容
         clean_content = sanitize_html(content)
         
-        # 内容审核
-        moderation_result = moderate_content(clean_content)
-        
-        # 根据审核结果决定状态
-        if moderation_result['action'] == 'BLOCK':
-            return jsonify({"error": "评论内容违反社区规范"}), 400
-        
-        comment_status = "approved" if moderation_result['action'] == 'ALLOW' else "pending"
-        client_notice = moderation_result.get('client_notice', '')
-        
-        # 创建评论
-        comment = Comment(
-            submission_id=submission_id,
-            parent_id=parent_id,
-            content=clean_content,
-            status=comment_status,
-            client_notice=client_notice,
-            user_ip=user_ip
+        # 一条守卫INSERT完成：提交已通过、父评论存在、每IP每分钟最多3条评论 三项检查与写入。
+        # 评论先以 pending 状态保存，内容审核在后台任务中进行，不占用请求worker
+        comment_id, reason = insert_comment(
+            submission_id, parent_id, clean_content, "pending", "", user_ip
         )
-        
-        db.session.add(comment)
+        if comment_id is None:
+            db.session.rollback()
+            if reason == REASON_SUBMISSION_NOT_FOUND:
+                return jsonify({"error": "记录不存在或未审核通过"}), 404
+            if reason == REASON_PARENT_NOT_FOUND:
+                return jsonify({"error": "父评论不存在"}), 404
+            return jsonify({"error": "评论过于频繁，请稍后再试"}), 429
         db.session.commit()
         
+        enqueue_comment_moderation(comment_id, moderate_content)
+        
         return jsonify({
             "success": True,
-            "message": "评论提交成功" if comment_status == "approved" else "评论已提交，等待审核",
-            "status": comment_status,
-            "notice": client_notice
-        })
+            "message": "评论已提交，正在审核",
+            "status": "pending",
+            "comment_id": comment_id,
+            "status_url": url_for(
+                "api.get_comment_status", comment_id=comment_id,
+                token=generate_comment_status_token(comment_id)
+            )
+        }), 202
         
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"评论提交失败: {e}")
         return jsonify({"error": "提交失败"}), 500
 
+@api_bp.route("/comment-status/<int:comment_id>", methods=["GET"])
+@rate_limit(limit=120, window=60)  # 120 per minute（页面轮询）
+def get_comment_status(comment_id: int):
+    """查询评论的后台审核状态（需要发表评论时返回的签名token）"""
+    try:
+        if not verify_comment_status_token(comment_id, request.args.get("token")):
+            return jsonify({"error": "无效的访问令牌"}), 403
+        
+        result = get_comment_moderation_status(comment_id)
+        if result is None:
+            return jsonify({"error": "评论不存在"}), 404
+        status, moderated, client_notice = result
+        
+        if not moderated:
+            message = "评论审核中"
+        elif status == "approved":
+            message = "评论提交成功"
+        elif status == "rejected":
+            message = "评论内容违反社区规范"
+        else:
+            message = "评论已提交，等待审核"
+        
+        response = jsonify({
+            "status": status,
+            "moderated": moderated,
+            "message": message,
+            "notice": client_notice
+        })
+        response.headers["Cache-Control"] = "no-store"
+        return response
+        
+    except Exception as e:
+        current_app.logger.error(f"获取评论审核状态失败: {e}")
+        return jsonify({"error": "操作失败"}), 500
+
 @api_bp.route("/admin/comments/<int:comment_id>", methods=["DELETE"])
 @admin_required
 def admin_delete_comment(comment_id: int):
@@ -241,6 +309,8 @@ def admin_delete_comment(comment_id: int):
         comment = Comment.query.get_or_404(comment_id)
         
         # 软删除：设置deleted=True而不是物理删除
+        if not comment.deleted and comment.status == "approved":
+            adjust_counters(comment.submission_id, comments=-1)
         comment.deleted = True
         
         db.session.commit()
@@ -255,29 +325,15 @@ def admin_delete_comment(comment_id: int):
 @api_bp.route("/admin/comments/<int:submission_id>", methods=["GET"])
 @admin_required
 def admin_get_comments(submission_id: int):
-    """管理员获取评论（包括未审核的）"""
+    """管理员获取评论树（包括未审核和已删除的）"""
     try:
-        comments = Comment.query.filter_by(
-            submission_id=submission_id,
-            deleted=False
-        ).order_by(Comment.created_at.desc()).all()
-        
-        comment_list = []
-        for comment in comments:
-            comment_data = {
-                "id": comment.id,
-                "content": comment.content,
-                "status": comment.status,
-                "created_at": comment.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-                "user_ip": comment.user_ip,
-                "parent_id": comment.parent_id,
-                "client_notice": comment.client_notice
-            }
-            comment_list.append(comment_data)
+        # 递归CTE一次取出全部评论树（含待审核、已拒绝、已删除的评论）
+        comments = get_admin_comment_tree(submission_id)
+        total = db.session.query(func.count(Comment.id)).filter_by(submission_id=submission_id).scalar()
         
         return jsonify({
-            "comments": comment_list,
-            "total": len(comment_list)
+            "comments": comments,
+            "total": total
         })
         
     except Exception as e:
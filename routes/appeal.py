@@ -9,6 +9,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from background_tasks import get_task_manager
 from utils.decorators import rate_limit
 from utils.email_sender import send_admin_notification
+from services.stats import refresh_site_stats
 
 # This will be set by the main app
 db = None
@@ -66,6 +67,7 @@ def appeal(submission_id: int):
         db.session.add(evidence)
     
     db.session.commit()
+    refresh_site_stats()
 
     # 发送管理员申诉通知邮件
     try:
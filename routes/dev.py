@@ -11,6 +11,9 @@ from datetime import datetime
 from flask import Blueprint, abort, redirect, url_for, flash, jsonify, current_app
 from sqlalchemy import func
 from utils.decorators import admin_required
+from services.homepage import invalidate_homepage_cache
+from services.stats import refresh_site_stats
+from services.search import sync_search_keys, search_cache_keys, invalidate_search_cache
 
 # This will be set by the main app
 db = None
@@ -59,6 +62,7 @@ def dev_seed10():
 
     submissions: list[Submission] = []
     evidences: list[Evidence] = []
+    new_search_keys = set()
 
     for i in range(10):
         prof_cn = f"测试教授{i+1}号"
@@ -84,6 +88,8 @@ def dev_seed10():
         submissions.append(sub)
         db.session.add(sub)
         db.session.flush()
+        sync_search_keys(sub)
+        new_search_keys |= search_cache_keys(sub)
 
         # 证据：复用已有图片文件；如无图片则跳过证据
         if image_files:
@@ -102,6 +108,9 @@ def dev_seed10():
     if evidences:
         db.session.add_all(evidences)
     db.session.commit()
+    invalidate_homepage_cache()
+    invalidate_search_cache(new_search_keys)
+    refresh_site_stats()
     flash("已生成10条测试数据（含图片），均允许展示在首页。", "success")
     return redirect(url_for("main.index"))
 
@@ -15,6 +15,7 @@ from background_tasks import get_task_manager
 from utils.decorators import rate_limit
 from utils.security import sanitize_html, validate_file_security
 from utils.email_sender import send_admin_notification
+from services.search import sync_search_keys
 
 # This will be set by the main app
 db = None
@@ -53,9 +54,6 @@ def upload():
         moderation_result = moderate_content(description)
         return jsonify(moderation_result)
 
-    # Check if moderation was already passed (skip redundant moderation)
-    moderation_passed = request.form.get('moderation_passed') == 'true'
-
     # Get form data first
     form_data = {
         'submitter_email': (request.form.get("submitter_email") or "").strip(),
@@ -105,20 +103,19 @@ def upload():
     # Sanitize description to prevent XSS
     description = sanitize_html(description)
     
-    # 内容审核 - 如果前端已经通过审核则跳过
-    if not moderation_passed:
-        moderation_result = moderate_content(description)
+    # 内容审核：前端预审过的相同描述直接命中审核缓存，不再调用API（不信任客户端的"已审核"标记）
+    moderation_result = moderate_content(description)
+    
+    # 如果审核未通过，返回修改建议
+    if moderation_result.get('action') == 'FLAG_AND_FIX':
+        # 将审核结果存储在form_data中，以便模板使用
+        form_data['moderation_result'] = moderation_result
         
-        # 如果审核未通过，返回修改建议
-        if moderation_result.get('action') == 'FLAG_AND_FIX':
-            # 将审核结果存储在form_data中，以便模板使用
-            form_data['moderation_result'] = moderation_result
-            
-            # 显示审核失败消息
-            client_notice = moderation_result.get('client_notice', '内容需要修改后才能发布')
-            flash(client_notice, "warning")
-            
-            return render_template("upload.html", form_data=form_data), 400
+        # 显示审核失败消息
+        client_notice = moderation_result.get('client_notice', '内容需要修改后才能发布')
+        flash(client_notice, "warning")
+        
+        return render_template("upload.html", form_data=form_data), 400
 
     tag_positive = form_data['tag_positive']
     tag_calm = form_data['tag_calm']
@@ -154,9 +151,14 @@ def upload():
         privacy_homepage=privacy_homepage,
         status=ReviewStatus.PENDING,
     )
+    if moderation_result.get('action') == 'PENDING':
+        # 自动审核服务不可用时降级：标记投稿，提醒管理员人工审核文字内容
+        submission.flagged = True
+        submission.admin_notes = f"自动内容审核未完成（{', '.join(moderation_result.get('reasons', []))}），需人工审核"
 
     db.session.add(submission)
     db.session.flush()  # obtain id before saving files
+    sync_search_keys(submission)  # 归一化查找键随提交记录一起写入
 
     saved_files = []
 
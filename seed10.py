@@ -9,6 +9,7 @@ if BASE_DIR not in sys.path:
     sys.path.insert(0, BASE_DIR)
 
 from app import app, db, Submission, ReviewStatus, ensure_schema_migrations
+from services.search import sync_search_keys
 
 
 WORD_BANK = [
@@ -72,6 +73,9 @@ def run_insert(n: int = 10):
             db.session.add(sub)
             new_items.append(sub)
 
+        db.session.flush()
+        for sub in new_items:
+            sync_search_keys(sub)
         db.session.commit()
 
         ids = [s.id for s in new_items]
@@ -3,26 +3,96 @@ Services package for NYU CLASS Professor Review System
 
 This package contains business logic services including:
 - Content moderation (OpenAI API integration)
+- Moderation verdict cache
+- Micro-batched moderation calls
+- Local rule-based moderation pre-filter
+- Shared OpenAI client
 - File processing (thumbnails, placeholders)
 - Email notifications
 - Thumbnail generation
+- Homepage payload caching
+- Denormalized like/comment counters
+- Site statistics snapshot
+- Atomic like toggling
+- Paginated comment threads
+- Asynchronous comment moderation
+- Normalized professor search keys
+- Rendered detail page cache
 """
 
 # Make services easily importable
 from .moderation import ModerationService, moderate_content, moderate_comment
+from .openai_client import OpenAIClientManager, get_openai_client, openai_slot, load_prompt_files
+from .moderation_cache import ModerationCacheService, get_cached_moderation, cache_moderation
+from .moderation_batch import ModerationBatchService, batch_moderate
+from .moderation_prefilter import ModerationPrefilterService, prefilter_moderation
 from .file_processing import FileProcessingService, generate_privacy_thumbnail, generate_document_placeholder
 from .email import EmailService, send_email_async
 from .thumbnails import ThumbnailService, generate_thumbnails_async
+from .counters import CounterService, adjust_counters, reconcile_counters
+from .likes import LikeService, toggle_submission_like, has_liked, get_like_statuses, refresh_like_filter
+from .comments import CommentService, get_comment_page, get_admin_comment_tree, insert_comment, comment_page_size
+from .comment_moderation import CommentModerationService, enqueue_comment_moderation, moderate_pending_comment, requeue_stale_comments, get_comment_moderation_status
+from .stats import SiteStatsService, get_site_stats, refresh_site_stats, bump_content_version
+from .search import SearchService, normalize_search_key, sync_search_keys, search_submissions, search_cache_keys, invalidate_search_cache, rebuild_search_keys
+from .detail_page import DetailPageService, get_detail_html
+from .homepage import HomepageService, get_homepage_payload, get_feed_page, invalidate_homepage_cache
 
 __all__ = [
     'ModerationService',
     'moderate_content', 
     'moderate_comment',
+    'OpenAIClientManager',
+    'get_openai_client',
+    'openai_slot',
+    'load_prompt_files',
+    'ModerationCacheService',
+    'get_cached_moderation',
+    'cache_moderation',
+    'ModerationBatchService',
+    'batch_moderate',
+    'ModerationPrefilterService',
+    'prefilter_moderation',
     'FileProcessingService',
     'generate_privacy_thumbnail',
     'generate_document_placeholder',
     'EmailService', 
     'send_email_async',
     'ThumbnailService',
-    'generate_thumbnails_async'
+    'generate_thumbnails_async',
+    'CounterService',
+    'adjust_counters',
+    'reconcile_counters',
+    'LikeService',
+    'toggle_submission_like',
+    'has_liked',
+    'get_like_statuses',
+    'refresh_like_filter',
+    'CommentService',
+    'get_comment_page',
+    'get_admin_comment_tree',
+    'insert_comment',
+    'comment_page_size',
+    'CommentModerationService',
+    'enqueue_comment_moderation',
+    'moderate_pending_comment',
+    'requeue_stale_comments',
+    'get_comment_moderation_status',
+    'SiteStatsService',
+    'get_site_stats',
+    'refresh_site_stats',
+    'bump_content_version',
+    'SearchService',
+    'normalize_search_key',
+    'sync_search_keys',
+    'search_submissions',
+    'search_cache_keys',
+    'invalidate_search_cache',
+    'rebuild_search_keys',
+    'DetailPageService',
+    'get_detail_html',
+    'HomepageService',
+    'get_homepage_payload',
+    'get_feed_page',
+    'invalidate_homepage_cache'
 ]
\ No newline at end of file
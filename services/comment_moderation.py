@@ -0,0 +1,181 @@
+"""
+Asynchronous comment moderation for NYU CLASS Professor Review System
+
+This module moves the LLM moderation call out of the comment POST request:
+comments are stored as pending, a background task (background_tasks)
+moderates the text and flips the comment to approved/rejected with one
+conditional UPDATE, and the detail page polls a signed status endpoint.
+The UPDATE only applies to comments that are still pending, unmoderated and
+not deleted, so re-running a task (retries, moderate_pending_comments.py)
+never double-counts an approval. When the moderation provider is
+unavailable (degraded result with action PENDING) the comment is left
+untouched. A periodic background job (requeue_stale) re-enqueues comments
+that are still unmoderated after COMMENT_MODERATION_REQUEUE_AFTER seconds,
+covering both deferred verdicts and tasks lost to a worker restart; the
+claim is one conditional UPDATE ... RETURNING on moderation_requeued_at, so
+only one worker requeues a given comment per period.
+"""
+
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, func, select, update
+from background_tasks import get_task_manager
+from models import get_models
+from services.counters import adjust_counters
+
+# 审核结果 action -> 评论状态（FLAG_AND_FIX 保持 pending，等待管理员处理）
+ACTION_STATUS = {
+    'ALLOW': 'approved',
+    'BLOCK': 'rejected',
+    'FLAG_AND_FIX': 'pending',
+}
+
+
+class CommentModerationService:
+    """Service for background comment moderation"""
+
+    @staticmethod
+    def moderate(comment_id: int, moderate_func) -> str:
+        """
+        后台任务：审核一条待审核评论并写回结果，返回最终状态。
+        评论不存在、已删除或已审核过时直接跳过
+        """
+        db = current_app.extensions['sqlalchemy']
+        Comment = get_models()['Comment']
+
+        row = db.session.query(Comment.submission_id, Comment.content).filter(
+            Comment.id == comment_id,
+            Comment.status == 'pending',
+            Comment.moderated_at.is_(None),
+            Comment.deleted.is_(False),
+        ).first()
+        # 调用审核接口前结束读事务，避免在网络请求期间占用数据库连接
+        db.session.rollback()
+        if row is None:
+            return 'skipped'
+
+        result = moderate_func(row.content)
+        if result.get('action') == 'PENDING':
+            # 审核服务不可用（熔断/超时）：不写 moderated_at，由周期任务稍后重新入队
+            current_app.logger.warning(f"评论审核延后: comment={comment_id}, reasons={result.get('reasons')}")
+            return 'deferred'
+        status = ACTION_STATUS.get(result.get('action'), 'pending')
+
+        updated = db.session.execute(
+            update(Comment)
+            .where(
+                Comment.id == comment_id,
+                Comment.status == 'pending',
+                Comment.moderated_at.is_(None),
+                Comment.deleted.is_(False),
+            )
+            .values(status=status, client_notice=result.get('client_notice', ''), moderated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if updated and status == 'approved':
+            adjust_counters(row.submission_id, comments=1)
+        db.session.commit()
+
+        current_app.logger.info(f"评论审核完成: comment={comment_id}, status={status}")
+        return status
+
+    @staticmethod
+    def enqueue(comment_id: int, moderate_func) -> None:
+        """提交后台审核任务（在评论写入并提交之后调用）"""
+        task_manager = get_task_manager(current_app._get_current_object())
+        task_manager.submit_task(
+            f"comment_moderation_{comment_id}",
+            CommentModerationService.moderate,
+            comment_id,
+            moderate_func,
+            max_retries=2
+        )
+
+    @staticmethod
+    def requeue_stale(moderate_func, stale_after: float, limit: int = 100) -> list:
+        """
+        周期任务：认领超过 stale_after 秒仍未审核的评论（从创建或上次重新入队算起）并重新提交审核任务，
+        返回重新入队的评论ID。认领通过条件 UPDATE 完成，多个worker同时执行时每条评论只会被一个worker认领
+        """
+        db = current_app.extensions['sqlalchemy']
+        Comment = get_models()['Comment']
+        now = datetime.utcnow()
+        stale = and_(
+            Comment.status == 'pending',
+            Comment.moderated_at.is_(None),
+            Comment.deleted.is_(False),
+            func.coalesce(Comment.moderation_requeued_at, Comment.created_at) < now - timedelta(seconds=stale_after),
+        )
+        candidates = select(Comment.id).where(stale).order_by(Comment.id).limit(limit)
+
+        comment_ids = [row[0] for row in db.session.execute(
+            update(Comment)
+            .where(Comment.id.in_(candidates), stale)
+            .values(moderation_requeued_at=now)
+            .returning(Comment.id)
+            .execution_options(synchronize_session=False)
+        )]
+        db.session.commit()
+        if not comment_ids:
+            return []
+
+        task_manager = get_task_manager(current_app._get_current_object())
+        for comment_id in sorted(comment_ids):
+            task_manager.submit_task(
+                f"comment_moderation_{comment_id}_requeue_{int(now.timestamp())}",
+                CommentModerationService.moderate,
+                comment_id,
+                moderate_func,
+                max_retries=0
+            )
+        current_app.logger.info(f"重新入队待审核评论: {len(comment_ids)} 条")
+        return comment_ids
+
+    @staticmethod
+    def get_status(comment_id: int):
+        """返回 (status, moderated, client_notice)，评论不存在或已删除时返回 None"""
+        db = current_app.extensions['sqlalchemy']
+        Comment = get_models()['Comment']
+        row = db.session.query(Comment.status, Comment.moderated_at, Comment.client_notice).filter(
+            Comment.id == comment_id,
+            Comment.deleted.is_(False),
+        ).first()
+        if row is None:
+            return None
+        return row.status, row.moderated_at is not None, row.client_notice or ''
+
+    @staticmethod
+    def pending_ids(limit: int = 500) -> list:
+        """尚未审核的评论ID（供补审脚本使用；运行中的服务由 requeue_stale 周期补审）"""
+        Comment = get_models()['Comment']
+        return [row[0] for row in Comment.query.with_entities(Comment.id).filter(
+            Comment.status == 'pending',
+            Comment.moderated_at.is_(None),
+            Comment.deleted.is_(False),
+        ).order_by(Comment.id).limit(limit)]
+
+
+# Convenience functions
+def enqueue_comment_moderation(comment_id: int, moderate_func) -> None:
+    """Convenience function for queueing background moderation of a comment"""
+    CommentModerationService.enqueue(comment_id, moderate_func)
+
+
+def moderate_pending_comment(comment_id: int, moderate_func) -> str:
+    """Convenience function for moderating one pending comment synchronously"""
+    return CommentModerationService.moderate(comment_id, moderate_func)
+
+
+def requeue_stale_comments(moderate_func, stale_after: float, limit: int = 100) -> list:
+    """Convenience function for the periodic requeue of stale pending comments"""
+    try:
+        return CommentModerationService.requeue_stale(moderate_func, stale_after, limit)
+    except Exception as e:
+        current_app.extensions['sqlalchemy'].session.rollback()
+        current_app.logger.error(f"重新入队待审核评论失败: {e}")
+        return []
+
+
+def get_comment_moderation_status(comment_id: int):
+    """Convenience function for a comment's moderation status"""
+    return CommentModerationService.get_status(comment_id)
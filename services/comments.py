@@ -0,0 +1,385 @@
+"""
+Comment thread service for NYU CLASS Professor Review System
+
+This module serves the public comment thread of a submission one page at a
+time: top-level comments are keyset-paginated on (created_at, id), and the
+reply trees under the roots of that page are loaded with one recursive CTE
+that returns every descendant with its depth and path. The CTE walks hidden
+(pending, rejected or deleted) comments too, so replies under them are kept
+and the hidden comment is rendered as a placeholder instead of dropping the
+whole branch. For the public view only visible comments and their ancestors
+are returned and ranked, so hidden replies never use up the per-thread
+budget. Hidden top-level comments without any visible descendant are
+dropped and do not count towards the page size; the page keeps fetching
+candidates until it is full. Depth and per-thread size are bounded by
+COMMENTS_MAX_DEPTH and COMMENTS_MAX_SUBTREE; the total is read from
+submissions.comment_count by the caller.
+
+New comments are written with one guarded INSERT ... SELECT ... WHERE whose
+guards check that the submission is approved, that the parent comment
+exists, and the per-IP posting rate. Only when the insert is refused does a
+second query determine which check failed.
+"""
+
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import Boolean, DateTime, Integer, String, Text, and_, cast, exists, func, insert, literal, or_, select
+from sqlalchemy.orm import aliased
+from models import get_models
+from utils.pagination import encode_cursor, decode_cursor
+
+DEFAULT_PAGE_SIZE = 20
+DEFAULT_MAX_DEPTH = 8
+DEFAULT_MAX_SUBTREE = 200
+
+# 每个IP在 RATE_WINDOW 秒内最多发布 RATE_LIMIT 条评论
+RATE_LIMIT = 3
+RATE_WINDOW = 60
+
+# 守卫INSERT被拒绝的原因
+REASON_SUBMISSION_NOT_FOUND = "submission_not_found"
+REASON_PARENT_NOT_FOUND = "parent_not_found"
+REASON_RATE_LIMITED = "rate_limited"
+
+
+def _is_visible(comment) -> bool:
+    """公开可见的评论：已通过审核且未删除"""
+    return comment.status == "approved" and not comment.deleted
+
+
+class CommentService:
+    """Service for paginated, threaded comment retrieval"""
+
+    @staticmethod
+    def _serialize(comment, depth: int) -> dict:
+        if not _is_visible(comment):
+            # 不可见的评论只保留位置，用于挂载其下可见的回复
+            return {
+                "id": comment.id,
+                "content": None,
+                "created_at": comment.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+                "depth": depth,
+                "hidden": True,
+                "replies": []
+            }
+        return {
+            "id": comment.id,
+            "content": comment.content,
+            "created_at": comment.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "depth": depth,
+            "replies": []
+        }
+
+    @staticmethod
+    def _serialize_admin(comment, depth: int) -> dict:
+        return {
+            "id": comment.id,
+            "content": comment.content,
+            "status": comment.status,
+            "deleted": comment.deleted,
+            "created_at": comment.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "user_ip": comment.user_ip,
+            "parent_id": comment.parent_id,
+            "client_notice": comment.client_notice,
+            "depth": depth,
+            "replies": []
+        }
+
+    @staticmethod
+    def fetch_threads(root_ids, max_depth: int = DEFAULT_MAX_DEPTH, max_subtree: int = DEFAULT_MAX_SUBTREE,
+                      visible_only: bool = False) -> list:
+        """
+        一次递归CTE查询取出这些根评论及其全部后代，
+        返回按 (depth, created_at, id) 排序的 (comment, root_id, depth, path) 列表。
+        path 为从根到该评论的ID路径（如 "12/40/41"）。
+        只返回深度不超过 max_depth + 1 的节点（最深一层用于判断是否还有更深的回复），
+        每个根最多返回 max_subtree + 1 个节点（多出的一个用于判断是否截断）；
+        max_subtree 为 None 时不限制。
+        visible_only 为 True 时只返回可见的评论及其祖先（占位），且只有这些节点参与数量编号，
+        待审核、已拒绝、已删除且没有可见后代的评论不占用 max_subtree 名额；为 False 时不过滤状态
+        """
+        if not root_ids:
+            return []
+        db = current_app.extensions['sqlalchemy']
+        Comment = get_models()['Comment']
+        comments = Comment.__table__
+
+        anchor = select(
+            comments.c.id,
+            comments.c.created_at,
+            comments.c.id.label("root_id"),
+            literal(0).label("depth"),
+            cast(comments.c.id, String).label("path"),
+        ).where(comments.c.id.in_(root_ids))
+        tree = anchor.cte("comment_tree", recursive=True)
+
+        child = comments.alias("child")
+        tree = tree.union_all(
+            select(
+                child.c.id,
+                child.c.created_at,
+                tree.c.root_id,
+                (tree.c.depth + 1).label("depth"),
+                # 递归项需与非递归项类型一致（PostgreSQL 中 varchar || text 的结果是 text）
+                cast(tree.c.path + "/" + cast(child.c.id, String), String).label("path"),
+            ).where(
+                child.c.parent_id == tree.c.id,
+                tree.c.depth <= max_depth,
+            )
+        )
+
+        # 每个线程按 (depth, created_at, id) 编号：截断时优先保留浅层回复，父节点总排在子节点之前
+        ranked = select(
+            tree.c.id,
+            tree.c.root_id,
+            tree.c.depth,
+            tree.c.path,
+            func.row_number().over(
+                partition_by=tree.c.root_id,
+                order_by=(tree.c.depth, tree.c.created_at, tree.c.id),
+            ).label("thread_rank"),
+        )
+        if visible_only:
+            # 从树中的可见评论沿 parent_id 向上收集祖先：得到可见评论及挂载它们所需的占位节点。
+            # 顶级评论的 parent_id 为 NULL，递归在根处结束；UNION 去重，多个可见回复共享的祖先只保留一次
+            visible = select(comments.c.id, comments.c.parent_id).select_from(
+                tree.join(comments, comments.c.id == tree.c.id)
+            ).where(
+                comments.c.status == "approved",
+                comments.c.deleted.is_(False),
+            ).cte("visible_tree", recursive=True)
+            parent = comments.alias("parent")
+            visible = visible.union(
+                select(parent.c.id, parent.c.parent_id).where(parent.c.id == visible.c.parent_id)
+            )
+            ranked = ranked.where(tree.c.id.in_(select(visible.c.id)))
+        ranked = ranked.subquery("ranked")
+
+        query = db.session.query(Comment, ranked.c.root_id, ranked.c.depth, ranked.c.path).join(
+            ranked, ranked.c.id == Comment.id
+        )
+        if max_subtree is not None:
+            query = query.filter(ranked.c.thread_rank <= max_subtree + 1)
+        return query.order_by(ranked.c.depth, Comment.created_at, Comment.id).all()
+
+    @staticmethod
+    def _build_trees(roots: list, rows: list, serialize, max_depth: int, max_subtree) -> None:
+        """
+        将 fetch_threads 的结果挂到根节点上。超出深度或数量上限的节点不返回，
+        在其父节点/根节点上标记 more_replies
+        """
+        nodes = {root["id"]: root for root in roots}
+        counts = {}
+        for comment, root_id, depth, _path in rows:
+            if depth == 0:
+                continue
+            parent = nodes.get(comment.parent_id)
+            if parent is None:
+                continue
+            counts[root_id] = counts.get(root_id, 1) + 1
+            if depth > max_depth:
+                parent["more_replies"] = True
+                continue
+            if max_subtree is not None and counts[root_id] > max_subtree:
+                nodes[root_id]["more_replies"] = True
+                continue
+            node = serialize(comment, depth)
+            parent["replies"].append(node)
+            nodes[comment.id] = node
+
+    @staticmethod
+    def _prune(node: dict) -> bool:
+        """去掉没有可见后代的占位节点，返回该节点是否保留"""
+        node["replies"] = [reply for reply in node["replies"] if CommentService._prune(reply)]
+        return not node.get("hidden") or bool(node["replies"]) or bool(node.get("more_replies"))
+
+    @staticmethod
+    def _limits() -> tuple:
+        return (
+            current_app.config.get('COMMENTS_MAX_DEPTH', DEFAULT_MAX_DEPTH),
+            current_app.config.get('COMMENTS_MAX_SUBTREE', DEFAULT_MAX_SUBTREE),
+        )
+
+    @staticmethod
+    def get_page(submission_id: int, cursor: str = None, page_size: int = DEFAULT_PAGE_SIZE) -> dict:
+        """
+        按 (created_at, id) 升序返回游标之后的一页顶级评论及其回复树，
+        返回 {comments, next_cursor, has_more}。没有可见内容的顶级评论不占用页面名额，
+        has_more 只在后面确实还有可显示的顶级评论时为真。游标无效时抛出ValueError
+        """
+        Comment = get_models()['Comment']
+        Reply = aliased(Comment)
+        Grandchild = aliased(Comment)
+
+        # 候选顶级评论：本身可见，或有可见回复、或有回复还带着下一层回复（可能挂着更深的可见回复）
+        query = Comment.query.filter(
+            Comment.submission_id == submission_id,
+            Comment.parent_id.is_(None),
+            or_(
+                and_(Comment.status == "approved", Comment.deleted.is_(False)),
+                exists().where(
+                    Reply.parent_id == Comment.id,
+                    or_(
+                        and_(Reply.status == "approved", Reply.deleted.is_(False)),
+                        exists().where(Grandchild.parent_id == Reply.id),
+                    ),
+                ),
+            ),
+        ).order_by(Comment.created_at.asc(), Comment.id.asc())
+        after = decode_cursor(cursor) if cursor else None
+
+        # 候选中仍可能有整棵子树都不可见的占位，剪枝后页面不足时继续向后取，
+        # 直到凑满 page_size + 1 条（多出的一条用于判断是否还有下一页）或没有更多候选
+        max_depth, max_subtree = CommentService._limits()
+        kept = []
+        while len(kept) <= page_size:
+            batch_query = query
+            if after is not None:
+                after_created_at, after_id = after
+                batch_query = batch_query.filter(or_(
+                    Comment.created_at > after_created_at,
+                    and_(Comment.created_at == after_created_at, Comment.id > after_id),
+                ))
+            need = page_size + 1 - len(kept)
+            batch = batch_query.limit(need).all()
+            if not batch:
+                break
+            after = (batch[-1].created_at, batch[-1].id)
+
+            roots = [CommentService._serialize(comment, 0) for comment in batch]
+            threads = CommentService.fetch_threads(
+                [root["id"] for root in roots], max_depth, max_subtree, visible_only=True
+            )
+            CommentService._build_trees(roots, threads, CommentService._serialize, max_depth, max_subtree)
+            created_at = {comment.id: comment.created_at for comment in batch}
+            kept.extend(
+                (root, created_at[root["id"]]) for root in roots if CommentService._prune(root)
+            )
+            if len(batch) < need:
+                break
+
+        page = kept[:page_size]
+        has_more = len(kept) > page_size
+        next_cursor = encode_cursor(page[-1][1], page[-1][0]["id"]) if has_more else None
+        return {
+            "comments": [root for root, _created_at in page],
+            "next_cursor": next_cursor,
+            "has_more": has_more
+        }
+
+    @staticmethod
+    def get_admin_tree(submission_id: int) -> list:
+        """管理员视图：全部评论（含待审核、已拒绝、已删除）的树，顶级评论按时间倒序"""
+        Comment = get_models()['Comment']
+        page = Comment.query.filter(
+            Comment.submission_id == submission_id,
+            Comment.parent_id.is_(None),
+        ).order_by(Comment.created_at.desc(), Comment.id.desc()).all()
+
+        max_depth, _max_subtree = CommentService._limits()
+        roots = [CommentService._serialize_admin(comment, 0) for comment in page]
+        threads = CommentService.fetch_threads([root["id"] for root in roots], max_depth, None)
+        CommentService._build_trees(roots, threads, CommentService._serialize_admin, max_depth, None)
+        return roots
+
+    @staticmethod
+    def _guards(submission_id: int, parent_id, user_ip: str) -> tuple:
+        """返回 (提交已通过, 父评论存在, 最近评论数未超限) 三个条件表达式"""
+        models = get_models()
+        Submission = models['Submission']
+        Comment = models['Comment']
+        since = datetime.utcnow() - timedelta(seconds=RATE_WINDOW)
+
+        submission_ok = exists().where(
+            Submission.id == submission_id,
+            Submission.status == models['ReviewStatus'].APPROVED,
+        )
+        if parent_id:
+            parent_ok = exists().where(
+                Comment.id == parent_id,
+                Comment.submission_id == submission_id,
+                Comment.deleted.is_(False),
+            )
+        else:
+            parent_ok = literal(True)
+        # 由 idx_comments_user_ip_created_at 覆盖
+        recent = select(func.count(Comment.id)).where(
+            Comment.user_ip == user_ip,
+            Comment.created_at > since,
+        ).scalar_subquery()
+        return submission_ok, parent_ok, recent < RATE_LIMIT
+
+    @staticmethod
+    def insert_comment(submission_id: int, parent_id, content: str, status: str,
+                       client_notice: str, user_ip: str) -> tuple:
+        """
+        一条 INSERT ... SELECT ... WHERE 语句完成提交/父评论/频率检查与写入（不提交事务），
+        返回 (comment_id, None)；检查未通过时返回 (None, 原因)
+        """
+        db = current_app.extensions['sqlalchemy']
+        Comment = get_models()['Comment']
+        guards = CommentService._guards(submission_id, parent_id, user_ip)
+
+        # 参数显式转换类型：PostgreSQL 会把 SELECT 列表中类型未知的参数（如 NULL）当作 text。
+        # 时间戳不做 CAST（SQLite 中 CAST AS DATETIME 会转成数值），由绑定参数类型处理
+        values = select(
+            cast(literal(submission_id), Integer),
+            cast(literal(parent_id or None), Integer),
+            cast(literal(content), Text),
+            cast(literal(status), String),
+            cast(literal(client_notice), Text),
+            cast(literal(False), Boolean),
+            cast(literal(user_ip), String),
+            literal(datetime.utcnow(), DateTime),
+        ).where(*guards)
+        comment_id = db.session.execute(
+            insert(Comment).from_select(
+                ['submission_id', 'parent_id', 'content', 'status', 'client_notice',
+                 'deleted', 'user_ip', 'created_at'],
+                values,
+            ).returning(Comment.id)
+        ).scalar()
+        if comment_id is not None:
+            return comment_id, None
+
+        # 仅在写入被拒绝时再查一次具体原因
+        submission_ok, parent_ok, rate_ok = db.session.execute(
+            select(*(guard.label(f"guard_{i}") for i, guard in enumerate(guards)))
+        ).one()
+        if not submission_ok:
+            return None, REASON_SUBMISSION_NOT_FOUND
+        if not parent_ok:
+            return None, REASON_PARENT_NOT_FOUND
+        return None, REASON_RATE_LIMITED
+
+    @staticmethod
+    def page_size_from(value) -> int:
+        """解析请求中的每页条数，限制在 1..COMMENTS_PAGE_SIZE_MAX 之间"""
+        default = current_app.config.get('COMMENTS_PAGE_SIZE', DEFAULT_PAGE_SIZE)
+        try:
+            page_size = int(value) if value else default
+        except (TypeError, ValueError):
+            page_size = default
+        return max(1, min(page_size, current_app.config.get('COMMENTS_PAGE_SIZE_MAX', 50)))
+
+
+# Convenience functions
+def get_comment_page(submission_id: int, cursor: str = None, page_size: int = DEFAULT_PAGE_SIZE) -> dict:
+    """Convenience function for one keyset page of a submission's comment thread"""
+    return CommentService.get_page(submission_id, cursor, page_size)
+
+
+def get_admin_comment_tree(submission_id: int) -> list:
+    """Convenience function for the admin comment tree (all statuses)"""
+    return CommentService.get_admin_tree(submission_id)
+
+
+def insert_comment(submission_id: int, parent_id, content: str, status: str,
+                   client_notice: str, user_ip: str) -> tuple:
+    """Convenience function for the guarded single-statement comment insert"""
+    return CommentService.insert_comment(submission_id, parent_id, content, status, client_notice, user_ip)
+
+
+def comment_page_size(value) -> int:
+    """Convenience function for clamping a requested comment page size"""
+    return CommentService.page_size_from(value)
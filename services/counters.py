@@ -0,0 +1,110 @@
+"""
+Counter service for NYU CLASS Professor Review System
+
+This module maintains the denormalized like_count / comment_count columns on
+submissions, plus the comments_version counter used as the comments ETag. Adjustments are single atomic UPDATE statements that join the
+caller's transaction (they never commit), so a like/comment write and its
+counter change land in the same commit.
+"""
+
+from flask import current_app
+from sqlalchemy import func, select, update
+from models import get_models
+
+
+class CounterService:
+    """Service for incremental and reconciled submission counters"""
+
+    @staticmethod
+    def adjust(submission_id: int, likes: int = 0, comments: int = 0) -> None:
+        """原子地增减计数（在当前事务中执行，由调用方提交）"""
+        if not likes and not comments:
+            return
+        db = current_app.extensions['sqlalchemy']
+        Submission = get_models()['Submission']
+
+        # 显式保留 updated_at：计数变化不应触发列上的 onupdate，否则会打乱首页排序和详情页缓存
+        values = {'updated_at': Submission.updated_at}
+        if likes:
+            values['like_count'] = Submission.like_count + likes
+        if comments:
+            values['comment_count'] = Submission.comment_count + comments
+            values['comments_version'] = Submission.comments_version + 1
+        db.session.execute(
+            update(Submission)
+            .where(Submission.id == submission_id)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+
+    @staticmethod
+    def reconcile(likes: bool = True, comments: bool = True, dry_run: bool = False) -> list:
+        """
+        用真实的 likes/comments 计数校正缓存列，返回有偏差的记录
+        [(submission_id, field, cached, actual), ...]
+        注意：校正 like_count 会覆盖管理员手动设置的点赞数
+        """
+        db = current_app.extensions['sqlalchemy']
+        models = get_models()
+        Submission = models['Submission']
+        Like = models['Like']
+        Comment = models['Comment']
+
+        like_subq = (
+            select(func.count(Like.id))
+            .where(Like.submission_id == Submission.id)
+            .scalar_subquery()
+        )
+        comment_subq = (
+            select(func.count(Comment.id))
+            .where(
+                Comment.submission_id == Submission.id,
+                Comment.status == 'approved',
+                Comment.deleted == False
+            )
+            .scalar_subquery()
+        )
+
+        rows = db.session.execute(
+            select(
+                Submission.id,
+                Submission.like_count,
+                Submission.comment_count,
+                like_subq.label('actual_likes'),
+                comment_subq.label('actual_comments'),
+            )
+        ).all()
+
+        drift = []
+        for row in rows:
+            if likes and row.like_count != row.actual_likes:
+                drift.append((row.id, 'like_count', row.like_count, row.actual_likes))
+            if comments and row.comment_count != row.actual_comments:
+                drift.append((row.id, 'comment_count', row.comment_count, row.actual_comments))
+
+        if drift and not dry_run:
+            for submission_id, field, _cached, actual in drift:
+                values = {field: actual, 'updated_at': Submission.updated_at}
+                if field == 'comment_count':
+                    values['comments_version'] = Submission.comments_version + 1
+                db.session.execute(
+                    update(Submission)
+                    .where(Submission.id == submission_id)
+                    .values(**values)
+                    .execution_options(synchronize_session=False)
+                )
+            db.session.commit()
+            current_app.logger.info(f"Reconciled {len(drift)} submission counters")
+
+        return drift
+
+
+# Convenience functions
+def adjust_counters(submission_id: int, likes: int = 0, comments: int = 0) -> None:
+    """Convenience function for atomic counter adjustments"""
+    CounterService.adjust(submission_id, likes=likes, comments=comments)
+
+
+def reconcile_counters(likes: bool = True, comments: bool = True, dry_run: bool = False) -> list:
+    """Convenience function for recomputing counters from source tables"""
+    return CounterService.reconcile(likes=likes, comments=comments, dry_run=dry_run)
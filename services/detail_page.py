@@ -0,0 +1,72 @@
+"""
+Detail page service for NYU CLASS Professor Review System
+
+This module renders the public submission detail fragment
+(public_detail_content.html) and caches the HTML in-process. The fragment
+only depends on the submission row, its evidences, the language and whether
+the name is masked, so repeat visitors skip the evidence query and the Jinja
+render; per-request parts (CSRF token, flash messages) stay in base.html.
+"""
+
+from flask import current_app, render_template, request, session
+from markupsafe import Markup
+from sqlalchemy.orm import selectinload
+from models import get_models
+from utils.cache import TTLCache, MISSING
+
+
+class DetailPageService:
+    """Service for rendering and caching the public detail fragment"""
+
+    # key: (submission_id, updated_at, like_count, lang, masked)；旧版本的条目由LRU淘汰
+    _cache = TTLCache(maxsize=512)
+
+    @staticmethod
+    def get_detail_html(submission_id: int, from_privacy: bool):
+        """
+        返回已通过提交的详情正文HTML，不存在时返回 None。
+        命中缓存时只做一次主键查询（读取版本字段）
+        """
+        db = current_app.extensions['sqlalchemy']
+        models = get_models()
+        Submission = models['Submission']
+        ReviewStatus = models['ReviewStatus']
+
+        version = db.session.query(Submission.updated_at, Submission.like_count).filter(
+            Submission.id == submission_id,
+            Submission.status == ReviewStatus.APPROVED,
+        ).first()
+        if version is None:
+            return None
+
+        lang = request.args.get('lang')
+        if lang not in ('zh', 'en'):
+            lang = session.get('language', 'zh')
+        # like_count 不会修改 updated_at，需要单独纳入缓存键
+        cache_key = (submission_id, version.updated_at, version.like_count, lang, bool(from_privacy))
+        html = DetailPageService._cache.get(cache_key)
+        if html is not MISSING:
+            return html
+
+        # 未命中：一次性预加载证据，避免模板中 sub.evidences 的懒加载查询
+        submission = Submission.query.options(selectinload(Submission.evidences)).filter_by(
+            id=submission_id, status=ReviewStatus.APPROVED
+        ).first()
+        if submission is None:
+            return None
+        html = Markup(render_template(
+            "public_detail_content.html",
+            sub=submission,
+            from_privacy=from_privacy,
+            ReviewStatus=ReviewStatus
+        ))
+        DetailPageService._cache.set(
+            cache_key, html, ttl=current_app.config.get('DETAIL_CACHE_TTL', 300)
+        )
+        return html
+
+
+# Convenience functions
+def get_detail_html(submission_id: int, from_privacy: bool):
+    """Convenience function for the cached detail page fragment"""
+    return DetailPageService.get_detail_html(submission_id, from_privacy)
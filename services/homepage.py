@@ -0,0 +1,147 @@
+"""
+Homepage service for NYU CLASS Professor Review System
+
+This module builds the homepage featured-card payload (cards with their
+counts) and caches it in-process so anonymous homepage hits do not re-run
+the list query on every request. The cache is per gunicorn worker; its key
+includes the shared content version from the site_stats row, so an
+invalidation in one worker makes every worker rebuild on its next request.
+Counter changes (likes, comments) do not invalidate it and show up after
+at most HOMEPAGE_CACHE_TTL seconds.
+"""
+
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import or_, and_
+from models import get_models
+from services.stats import SiteStatsService, bump_content_version
+from utils.cache import TTLCache, MISSING
+from utils.pagination import encode_cursor, decode_cursor
+
+# 首页卡片需要的标签字段
+CARD_TAG_FIELDS = (
+    'tag_loyal', 'tag_stable', 'tag_sincere', 'tag_humorous',
+    'tag_positive', 'tag_calm', 'tag_leadership', 'tag_homework_heavy',
+    'tag_custom',
+)
+
+
+class HomepageService:
+    """Service for building and caching the homepage payload"""
+
+    # key: (limit, 内容版本号)；卡片数据与界面语言无关
+    _cache = TTLCache(maxsize=128)
+
+    @staticmethod
+    def _build_card(submission) -> dict:
+        """将Submission转换为可缓存的卡片数据（不持有ORM对象）"""
+        card = {
+            'id': submission.id,
+            'display_name': submission.get_display_name(masked=True),
+            'description': submission.description or '',
+            # 计数直接读取提交记录上的缓存列，无需GROUP BY聚合
+            'like_count_display': submission.like_count,
+            'comment_count_display': submission.comment_count,
+        }
+        for field in CARD_TAG_FIELDS:
+            card[field] = getattr(submission, field)
+        return card
+
+    @staticmethod
+    def encode_cursor(updated_at: datetime, submission_id: int) -> str:
+        """将(updated_at, id)编码为不透明的分页游标"""
+        return encode_cursor(updated_at, submission_id)
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> tuple:
+        """解析分页游标，格式错误时抛出ValueError"""
+        return decode_cursor(cursor)
+
+    @staticmethod
+    def _fetch_page(page_size: int, after: tuple = None) -> tuple:
+        """
+        按 (updated_at DESC, id DESC) 做keyset分页，
+        返回 (卡片列表, 下一页游标或None)
+        """
+        models = get_models()
+        ReviewStatus = models['ReviewStatus']
+        Submission = models['Submission']
+
+        query = Submission.query.filter(
+            Submission.status == ReviewStatus.APPROVED,
+            Submission.privacy_homepage.is_(True),
+        )
+        if after is not None:
+            after_updated_at, after_id = after
+            query = query.filter(or_(
+                Submission.updated_at < after_updated_at,
+                and_(Submission.updated_at == after_updated_at, Submission.id < after_id),
+            ))
+        # 多取一条判断是否还有下一页
+        rows = (
+            query
+            .order_by(Submission.updated_at.desc(), Submission.id.desc())
+            .limit(page_size + 1)
+            .all()
+        )
+        page = rows[:page_size]
+        next_cursor = None
+        if len(rows) > page_size:
+            last = page[-1]
+            next_cursor = HomepageService.encode_cursor(last.updated_at, last.id)
+
+        cards = [HomepageService._build_card(s) for s in page]
+        return cards, next_cursor
+
+    @staticmethod
+    def _build_payload(limit: int) -> dict:
+        """查询数据库构建首页数据（站点统计由 services.stats 快照提供）"""
+        cards, next_cursor = HomepageService._fetch_page(limit)
+        return {
+            'cards': cards,
+            'next_cursor': next_cursor,
+        }
+
+    @staticmethod
+    def get_homepage_payload(limit: int) -> dict:
+        """获取首页数据，优先从缓存读取（其他worker失效后版本号变化，旧条目不再命中）"""
+        key = (limit, SiteStatsService.content_version())
+        payload = HomepageService._cache.get(key)
+        if payload is not MISSING:
+            return payload
+
+        payload = HomepageService._build_payload(limit)
+        HomepageService._cache.set(key, payload, ttl=current_app.config.get('HOMEPAGE_CACHE_TTL', 60))
+        return payload
+
+    @staticmethod
+    def get_feed_page(cursor: str = None, page_size: int = 12) -> dict:
+        """
+        首页"加载更多"的keyset分页，只返回游标之后的一页，
+        成本与第一页相同。游标无效时抛出ValueError
+        """
+        after = HomepageService.decode_cursor(cursor) if cursor else None
+        cards, next_cursor = HomepageService._fetch_page(page_size, after)
+        return {'cards': cards, 'next_cursor': next_cursor}
+
+    @staticmethod
+    def invalidate():
+        """提交状态或内容变化后清空本进程缓存，并递增共享版本号使其他worker失效"""
+        HomepageService._cache.clear()
+        bump_content_version()
+
+
+# Convenience functions
+def get_homepage_payload(limit: int) -> dict:
+    """Convenience function for fetching the (cached) homepage payload"""
+    return HomepageService.get_homepage_payload(limit)
+
+
+def get_feed_page(cursor: str = None, page_size: int = 12) -> dict:
+    """Convenience function for fetching one keyset page of the homepage feed"""
+    return HomepageService.get_feed_page(cursor, page_size)
+
+
+def invalidate_homepage_cache():
+    """Convenience function for dropping cached homepage payloads"""
+    HomepageService.invalidate()
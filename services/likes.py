@@ -0,0 +1,216 @@
+"""
+Like service for NYU CLASS Professor Review System
+
+This module implements the like toggle as one short transaction:
+DELETE ... RETURNING removes an existing like, otherwise
+INSERT ... ON CONFLICT DO NOTHING RETURNING adds one, and a single
+UPDATE ... RETURNING adjusts submissions.like_count by the same delta and
+returns the new count. The unique_like_fingerprint constraint and the row lock
+taken by the UPDATE keep the counter correct under concurrent toggles.
+It also answers batch like-status lookups for card grids in one query, and
+keeps an in-memory Bloom filter of fingerprints that have liked anything so
+that like-status checks for visitors who never liked skip the likes lookup.
+The filter is built and refreshed by a background job in each worker, never
+inside a request, and a negative answer returns without touching the
+database. Likes made in the same worker are added immediately; likes made
+in another worker can read as not-liked for up to
+LIKE_FILTER_REFRESH_INTERVAL seconds. Only the displayed status is affected:
+toggle() always decides from the likes table.
+"""
+
+import threading
+from flask import current_app
+from sqlalchemy import and_, delete, func, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from models import get_models
+from utils.bloom import BloomFilter
+
+# 增量刷新时回看的ID范围：并发事务可能乱序提交，较小的ID可能晚于较大的ID可见
+FILTER_ID_OVERLAP = 1000
+
+
+class LikeService:
+    """Service for atomic like toggling"""
+
+    # 点过赞的指纹集合（每个进程一份），由后台任务在启动时构建并周期性增量刷新。
+    # 本进程的点赞立即加入；其他worker的新点赞最多延迟 LIKE_FILTER_REFRESH_INTERVAL 秒后加入
+    _filter = None
+    _filter_last_id = 0
+    _filter_lock = threading.Lock()
+
+    @staticmethod
+    def _filter_key(fingerprint: int) -> str:
+        return str(fingerprint)
+
+    @staticmethod
+    def refresh_filter() -> None:
+        """
+        构建或增量刷新点赞指纹过滤器（后台任务调用，不在用户请求中执行）：
+        首次（或超出容量）时全量扫描 likes，之后按 likes.id 增量追加新点赞
+        """
+        if not current_app.config.get('LIKE_FILTER_ENABLED', True):
+            LikeService._filter = None
+            return
+
+        with LikeService._filter_lock:
+            db = current_app.extensions['sqlalchemy']
+            Like = get_models()['Like']
+            bloom = LikeService._filter
+            if bloom is None or bloom.saturated:
+                total = db.session.query(func.count(Like.id)).scalar() or 0
+                capacity = max(current_app.config.get('LIKE_FILTER_CAPACITY', 100000), total * 2)
+                bloom = BloomFilter(capacity=capacity, error_rate=0.01)
+                last_id = 0
+            else:
+                last_id = LikeService._filter_last_id
+
+            rows = db.session.query(Like.id, Like.fingerprint).filter(
+                Like.id > last_id - FILTER_ID_OVERLAP
+            ).order_by(Like.id).yield_per(5000)
+            for like_id, fingerprint in rows:
+                bloom.add(LikeService._filter_key(fingerprint))
+                last_id = max(last_id, like_id)
+            db.session.rollback()
+
+            # 扫描时尚未提交的较小ID由下次刷新的 FILTER_ID_OVERLAP 回看补上
+            LikeService._filter = bloom
+            LikeService._filter_last_id = last_id
+
+    @staticmethod
+    def _filter_says_never_liked(fingerprint: int) -> bool:
+        """过滤器能否断定该指纹从未点过赞（不查询数据库）；过滤器未构建或命中时返回 False"""
+        bloom = LikeService._filter
+        if bloom is None or not current_app.config.get('LIKE_FILTER_ENABLED', True):
+            return False
+        return LikeService._filter_key(fingerprint) not in bloom
+
+    @staticmethod
+    def has_liked(submission_id: int, fingerprint: int) -> bool:
+        """当前指纹是否点赞过该提交；过滤器断定从未点过赞时不查询 likes 记录"""
+        try:
+            if LikeService._filter_says_never_liked(fingerprint):
+                return False
+        except Exception as e:
+            current_app.logger.warning(f"点赞过滤器检查失败: {e}")
+
+        db = current_app.extensions['sqlalchemy']
+        Like = get_models()['Like']
+        return db.session.query(Like.id).filter_by(
+            submission_id=submission_id,
+            fingerprint=fingerprint
+        ).first() is not None
+
+    @staticmethod
+    def _insert(db, table):
+        """按数据库方言选择支持 ON CONFLICT 的 INSERT 构造"""
+        if db.engine.dialect.name == 'sqlite':
+            return sqlite.insert(table)
+        return postgresql.insert(table)
+
+    @staticmethod
+    def toggle(submission_id: int, fingerprint: int):
+        """
+        切换点赞状态并提交事务，返回 (liked, like_count)；
+        提交记录不存在或未审核通过时回滚并返回 None
+        """
+        db = current_app.extensions['sqlalchemy']
+        models = get_models()
+        Submission = models['Submission']
+        Like = models['Like']
+
+        try:
+            # 1. 已点赞则删除
+            removed = db.session.execute(
+                delete(Like)
+                .where(Like.submission_id == submission_id, Like.fingerprint == fingerprint)
+                .returning(Like.id)
+                .execution_options(synchronize_session=False)
+            ).first()
+
+            if removed is not None:
+                liked, delta = False, -1
+            else:
+                # 2. 未点赞则插入；并发请求已插入时不重复计数
+                inserted = db.session.execute(
+                    LikeService._insert(db, Like.__table__)
+                    .values(submission_id=submission_id, fingerprint=fingerprint)
+                    .on_conflict_do_nothing(index_elements=['submission_id', 'fingerprint'])
+                    .returning(Like.__table__.c.id)
+                ).first()
+                liked, delta = True, (1 if inserted is not None else 0)
+
+            # 3. 同一事务中调整计数并返回新值（保留 updated_at，避免触发 onupdate）
+            like_count = db.session.execute(
+                update(Submission)
+                .where(Submission.id == submission_id, Submission.status == models['ReviewStatus'].APPROVED)
+                .values(like_count=Submission.like_count + delta, updated_at=Submission.updated_at)
+                .returning(Submission.like_count)
+                .execution_options(synchronize_session=False)
+            ).scalar()
+        except IntegrityError:
+            # 提交记录不存在（外键约束失败）
+            db.session.rollback()
+            return None
+
+        if like_count is None:
+            db.session.rollback()
+            return None
+
+        db.session.commit()
+        if liked and LikeService._filter is not None:
+            LikeService._filter.add(LikeService._filter_key(fingerprint))
+        return liked, like_count
+
+    @staticmethod
+    def batch_status(submission_ids, fingerprint: int) -> list:
+        """
+        一次查询返回多个已通过提交的点赞数和当前用户是否点赞：
+        submissions LEFT JOIN likes，连接条件命中 unique_like_fingerprint 索引。
+        不存在或未通过的ID不出现在结果中
+        """
+        if not submission_ids:
+            return []
+        db = current_app.extensions['sqlalchemy']
+        models = get_models()
+        Submission = models['Submission']
+        Like = models['Like']
+
+        rows = db.session.query(
+            Submission.id, Submission.like_count, Like.id
+        ).outerjoin(Like, and_(
+            Like.submission_id == Submission.id,
+            Like.fingerprint == fingerprint,
+        )).filter(
+            Submission.id.in_(submission_ids),
+            Submission.status == models['ReviewStatus'].APPROVED,
+        ).all()
+        return [
+            {"id": submission_id, "liked": like_id is not None, "like_count": like_count}
+            for submission_id, like_count, like_id in rows
+        ]
+
+
+# Convenience functions
+def toggle_submission_like(submission_id: int, fingerprint: int):
+    """Convenience function for the atomic like toggle"""
+    return LikeService.toggle(submission_id, fingerprint)
+
+
+def has_liked(submission_id: int, fingerprint: int) -> bool:
+    """Convenience function for a single like-status check"""
+    return LikeService.has_liked(submission_id, fingerprint)
+
+
+def get_like_statuses(submission_ids, fingerprint: int) -> list:
+    """Convenience function for batch like-status lookups"""
+    return LikeService.batch_status(submission_ids, fingerprint)
+
+
+def refresh_like_filter():
+    """Convenience function for the background like-filter refresh"""
+    try:
+        LikeService.refresh_filter()
+    except Exception as e:
+        current_app.extensions['sqlalchemy'].session.rollback()
+        current_app.logger.error(f"点赞过滤器刷新失败: {e}")
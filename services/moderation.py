@@ -2,28 +2,50 @@
 Content moderation service for NYU CLASS Professor Review System
 
 This module contains functions for content moderation using OpenAI API.
+Verdicts are cached by (prompt version, schema version, text hash), see
+services/moderation_cache.py. With MODERATION_BATCH_ENABLED, concurrent
+requests are merged into multi-item calls, see services/moderation_batch.py.
+Texts that local rules can decide on never reach the API, see
+services/moderation_prefilter.py.
+
+API calls go through a per-process circuit breaker. While the provider is
+failing or slow the breaker fails fast, and callers get a degraded
+response (MODERATION_DEGRADED_MODE): 'pending' leaves the text for later
+moderation / manual review, 'allow' keeps the old allow-on-error behaviour.
 """
 
-import os
 import json
+import time
+import threading
 import openai
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 from flask import current_app
+from services.moderation_cache import ModerationCacheService
+from services.moderation_batch import ModerationBatchService, batch_moderate
+from services.moderation_prefilter import ModerationPrefilterService
+from services.openai_client import ClientBusyError, get_openai_client, openai_slot, load_prompt_files
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+# 计入熔断器失败率的错误：连接失败/超时、5xx、限流。
+# 本进程并发名额耗尽（ClientBusyError）是本地过载，不代表服务商故障，不计入
+PROVIDER_ERRORS = (
+    openai.APIConnectionError,
+    openai.InternalServerError,
+    openai.RateLimitError,
+)
 
 
 class ModerationService:
     """Service for content moderation using OpenAI API"""
     
+    _breaker = None
+    _breaker_settings = None
+    _breaker_lock = threading.Lock()
+    
     @staticmethod
     def _get_openai_client():
-        """Initialize and return OpenAI client"""
-        api_key = current_app.config.get('OPENAI_API_KEY')
-        if not api_key:
-            return None
-            
-        if current_app.config.get('OPENAI_BASE_URL'):
-            return openai.OpenAI(api_key=api_key, base_url=current_app.config.get('OPENAI_BASE_URL'))
-        else:
-            return openai.OpenAI(api_key=api_key)
+        """Return the shared per-process OpenAI client (pooled keep-alive connections)"""
+        return get_openai_client()
     
     @staticmethod
     def _parse_version(version_str: str) -> tuple:
@@ -42,18 +64,8 @@ class ModerationService:
     
     @staticmethod
     def _load_config_files(prompt_filename: str, schema_filename: str) -> tuple:
-        """Load prompt and schema configuration files"""
-        # Files are in the root directory of the app
-        prompt_path = os.path.join(current_app.root_path, prompt_filename)
-        schema_path = os.path.join(current_app.root_path, schema_filename)
-        
-        with open(prompt_path, 'r', encoding='utf-8') as f:
-            prompt_content = f.read()
-        
-        with open(schema_path, 'r', encoding='utf-8') as f:
-            schema_content = json.loads(f.read())
-            
-        return prompt_content, schema_content
+        """Load prompt and schema configuration files (cached, reloaded when modified)"""
+        return load_prompt_files(prompt_filename, schema_filename)
     
     @staticmethod
     def _create_default_response(action='ALLOW', reasons=None, client_notice=''):
@@ -64,6 +76,51 @@ class ModerationService:
             'client_notice': client_notice
         }
     
+    @staticmethod
+    def _create_degraded_response(reason: str) -> dict:
+        """
+        审核服务不可用时的降级结果（MODERATION_DEGRADED_MODE）：
+        pending - action=PENDING，评论保留待审核稍后补审，投稿标记为需人工审核；
+        allow   - 与默认结果相同直接放行
+        """
+        if current_app.config.get('MODERATION_DEGRADED_MODE', 'pending') == 'allow':
+            response = ModerationService._create_default_response(reasons=[reason])
+        else:
+            response = ModerationService._create_default_response(action='PENDING', reasons=[reason])
+        response['degraded'] = True
+        return response
+    
+    @staticmethod
+    def _log_breaker_state(old_state: str, new_state: str) -> None:
+        current_app.logger.warning(f"Moderation circuit breaker: {old_state} -> {new_state}")
+    
+    @staticmethod
+    def _get_breaker():
+        """返回本进程的熔断器，未启用时返回 None；配置变化时重建"""
+        config = current_app.config
+        if not config.get('MODERATION_BREAKER_ENABLED', True):
+            return None
+        settings = (
+            config.get('MODERATION_BREAKER_WINDOW', 20),
+            config.get('MODERATION_BREAKER_MIN_CALLS', 4),
+            config.get('MODERATION_BREAKER_FAILURE_RATE', 0.5),
+            config.get('MODERATION_BREAKER_SLOW_SECONDS', 15),
+            config.get('MODERATION_BREAKER_SLOW_RATE', 0.8),
+            config.get('MODERATION_BREAKER_OPEN_SECONDS', 30),
+        )
+        if ModerationService._breaker is not None and ModerationService._breaker_settings == settings:
+            return ModerationService._breaker
+        with ModerationService._breaker_lock:
+            if ModerationService._breaker is None or ModerationService._breaker_settings != settings:
+                window, min_calls, failure_rate, slow_seconds, slow_rate, open_seconds = settings
+                ModerationService._breaker = CircuitBreaker(
+                    window=window, min_calls=min_calls, failure_rate=failure_rate,
+                    slow_call_seconds=slow_seconds, slow_call_rate=slow_rate,
+                    open_seconds=open_seconds, on_state_change=ModerationService._log_breaker_state,
+                )
+                ModerationService._breaker_settings = settings
+            return ModerationService._breaker
+    
     @staticmethod
     def _validate_response(result: dict) -> dict:
         """Validate and normalize moderation response"""
@@ -81,6 +138,93 @@ class ModerationService:
         
         return result
     
+    @staticmethod
+    def _request(input_text: str, schema_content: dict) -> dict:
+        """
+        调用Responses API并返回解析后的JSON（单条与批量审核共用）
+        接口异常原样抛出；没有JSON输出时抛出 JSONDecodeError
+        """
+        client = ModerationService._get_openai_client()
+        if not client:
+            raise openai.OpenAIError("OpenAI API key not configured")
+
+        breaker = ModerationService._get_breaker()
+        permit = None
+        if breaker is not None:
+            permit = breaker.allow()
+            if permit is None:
+                raise CircuitOpenError(f"moderation provider unavailable, retry in {breaker.retry_after():.0f}s")
+
+        started = None
+        failed = False
+        try:
+            with openai_slot():
+                started = time.monotonic()
+                response = client.responses.create(
+                    model=current_app.config.get('OPENAI_MODEL', 'gpt-5'),
+                    input=input_text,
+                    reasoning={'effort': 'minimal'},
+                    text={
+                        'verbosity': 'low',
+                        'format': {
+                            'type': 'json_schema',
+                            'name': schema_content.get('name', 'ModerationSchema'),
+                            'schema': schema_content.get('schema', {}),
+                            'strict': bool(schema_content.get('strict', False)),
+                        },
+                    },
+                    timeout=current_app.config.get('OPENAI_API_TIMEOUT', 30),
+                )
+        except PROVIDER_ERRORS:
+            failed = True
+            raise
+        finally:
+            # 其他错误（如 4xx 请求错误）说明服务本身可用，不计入失败
+            if breaker is not None:
+                if started is None:
+                    # 没有拿到并发名额，请求未发出：归还凭证，不计入结果
+                    breaker.release(permit)
+                else:
+                    breaker.record(failed, time.monotonic() - started, permit)
+
+        current_app.logger.info("OpenAI response received. id=%s", getattr(response, 'id', '<no id>'))
+
+        # 解析响应
+        result = None
+        try:
+            output_text = getattr(response, 'output_text', None)
+            if output_text:
+                result = json.loads(output_text)
+        except Exception:
+            result = None
+
+        if result is None:
+            try:
+                output = getattr(response, 'output', None)
+                if output:
+                    for item in output:
+                        contents = getattr(item, 'content', [])
+                        for content in contents:
+                            content_json = getattr(content, 'json', None)
+                            if content_json is not None:
+                                result = content_json
+                                break
+                        if result is not None:
+                            break
+            except Exception:
+                result = None
+
+        if result is None or not isinstance(result, dict):
+            raise json.JSONDecodeError("No JSON output found", doc=str(response), pos=0)
+        return result
+
+    @staticmethod
+    def _moderate(group: str, prompt_content: str, schema_content: dict, text: str) -> dict:
+        """单条调用，或在启用批量审核时交给批量调度器与其他并发请求合并发送"""
+        if ModerationBatchService.enabled():
+            return batch_moderate(group, prompt_content, schema_content, text, ModerationService._request)
+        return ModerationService._request(ModerationBatchService.single_input(prompt_content, text), schema_content)
+    
     @staticmethod
     def moderate_content(text: str) -> dict:
         """
@@ -92,6 +236,26 @@ class ModerationService:
             if not current_app.config.get('CONTENT_MODERATION_ENABLED', True):
                 return ModerationService._create_default_response(reasons=['Content moderation disabled'])
             
+            # 读取配置文件
+            try:
+                prompt_content, schema_content = ModerationService._load_config_files('Prompt.txt', 'json.txt')
+            except Exception as e:
+                current_app.logger.error(f"Failed to read prompt or schema files: {e}")
+                return ModerationService._create_default_response(reasons=['Config file error'])
+            
+            # 本地规则能确定结论（明确的联系方式/证件号，或无任何风险线索的短文本）时不调用接口
+            local_result = ModerationPrefilterService.check('content', schema_content, text)
+            if local_result is not None:
+                current_app.logger.info(f"Content moderation decided locally: {local_result['action']}")
+                return ModerationService._validate_response(local_result)
+            
+            # 相同文本（同一提示词/schema版本）只审核一次
+            cache_key = ModerationCacheService.make_key(prompt_content, schema_content, text)
+            cached = ModerationCacheService.get(cache_key)
+            if cached is not None:
+                current_app.logger.info(f"Content moderation cache hit: {cached.get('action', 'UNKNOWN')}")
+                return cached
+            
             # 获取OpenAI客户端
             client = ModerationService._get_openai_client()
             if not client:
@@ -103,75 +267,32 @@ class ModerationService:
                 current_app.logger.error("OpenAI SDK too old for Responses API (need >= 1.55)")
                 return ModerationService._create_default_response(reasons=['OpenAI SDK too old (need >= 1.55)'])
             
-            # 读取配置文件
-            try:
-                prompt_content, schema_content = ModerationService._load_config_files('Prompt.txt', 'json.txt')
-            except Exception as e:
-                current_app.logger.error(f"Failed to read prompt or schema files: {e}")
-                return ModerationService._create_default_response(reasons=['Config file error'])
-            
             # 调用OpenAI API
             current_app.logger.info("Calling OpenAI Responses API for content moderation... model=%s, timeout=%ss", 
                                    current_app.config.get('OPENAI_MODEL', 'gpt-5'), 
                                    current_app.config.get('OPENAI_API_TIMEOUT', 30))
             
-            response = client.responses.create(
-                model=current_app.config.get('OPENAI_MODEL', 'gpt-5'),
-                input=f"{prompt_content}\n\n用户内容：\n{text}",
-                reasoning={'effort': 'minimal'},
-                text={
-                    'verbosity': 'low',
-                    'format': {
-                        'type': 'json_schema',
-                        'name': schema_content.get('name', 'ModerationSchema'),
-                        'schema': schema_content.get('schema', {}),
-                        'strict': bool(schema_content.get('strict', False)),
-                    },
-                },
-                timeout=current_app.config.get('OPENAI_API_TIMEOUT', 30),
-            )
-            
-            current_app.logger.info("OpenAI response received. id=%s", getattr(response, 'id', '<no id>'))
-            
-            # 解析响应
-            result = None
-            try:
-                output_text = getattr(response, 'output_text', None)
-                if output_text:
-                    result = json.loads(output_text)
-            except Exception:
-                result = None
-                
-            if result is None:
-                try:
-                    output = getattr(response, 'output', None)
-                    if output:
-                        for item in output:
-                            contents = getattr(item, 'content', [])
-                            for content in contents:
-                                content_json = getattr(content, 'json', None)
-                                if content_json is not None:
-                                    result = content_json
-                                    break
-                            if result is not None:
-                                break
-                except Exception:
-                    result = None
-            
-            if result is None:
-                raise json.JSONDecodeError("No JSON output found", doc=str(response), pos=0)
+            result = ModerationService._moderate('content', prompt_content, schema_content, text)
             
             # 记录审核日志
             current_app.logger.info(f"Content moderation result: {result.get('action', 'UNKNOWN')}")
             
-            return ModerationService._validate_response(result)
+            result = ModerationService._validate_response(result)
+            ModerationCacheService.set(cache_key, result)
+            return result
             
-        except openai.APITimeoutError:
+        except CircuitOpenError as e:
+            current_app.logger.warning(f"Moderation circuit open: {e}")
+            return ModerationService._create_degraded_response('Circuit open')
+        except ClientBusyError:
+            current_app.logger.error("OpenAI concurrency limit reached")
+            return ModerationService._create_degraded_response('Concurrency limit')
+        except (openai.APITimeoutError, FuturesTimeoutError):
             current_app.logger.error("OpenAI API timeout")
-            return ModerationService._create_default_response(reasons=['API timeout'])
+            return ModerationService._create_degraded_response('API timeout')
         except openai.APIError as e:
             current_app.logger.error(f"OpenAI API error: {e}")
-            return ModerationService._create_default_response(reasons=['API error'])
+            return ModerationService._create_degraded_response('API error')
         except json.JSONDecodeError as e:
             current_app.logger.error(f"Failed to parse OpenAI response: {e}")
             return ModerationService._create_default_response(reasons=['Response parse error'])
@@ -190,6 +311,26 @@ class ModerationService:
             if not current_app.config.get('CONTENT_MODERATION_ENABLED', True):
                 return ModerationService._create_default_response(reasons=['Content moderation disabled'])
             
+            # 读取评论审核的配置文件
+            try:
+                prompt_content, schema_content = ModerationService._load_config_files('Comment Prompt.txt', 'comment schema.json')
+            except Exception as e:
+                current_app.logger.error(f"Failed to read comment prompt or schema files: {e}")
+                return ModerationService._create_default_response(reasons=['Config file error'])
+            
+            # 本地规则能确定结论（明确的联系方式/证件号，或无任何风险线索的短文本）时不调用接口
+            local_result = ModerationPrefilterService.check('comment', schema_content, content)
+            if local_result is not None:
+                current_app.logger.info(f"Comment moderation decided locally: {local_result['action']}")
+                return ModerationService._validate_response(local_result)
+            
+            # 相同文本（同一提示词/schema版本）只审核一次
+            cache_key = ModerationCacheService.make_key(prompt_content, schema_content, content)
+            cached = ModerationCacheService.get(cache_key)
+            if cached is not None:
+                current_app.logger.info(f"Comment moderation cache hit: {cached.get('action', 'UNKNOWN')}")
+                return cached
+            
             # 获取OpenAI客户端
             client = ModerationService._get_openai_client()
             if not client:
@@ -201,72 +342,31 @@ class ModerationService:
                 current_app.logger.error("OpenAI SDK too old for Responses API (need >= 1.55)")
                 return ModerationService._create_default_response(reasons=['OpenAI SDK too old (need >= 1.55)'])
             
-            # 读取评论审核的配置文件
-            try:
-                prompt_content, schema_content = ModerationService._load_config_files('Comment Prompt.txt', 'comment schema.json')
-            except Exception as e:
-                current_app.logger.error(f"Failed to read comment prompt or schema files: {e}")
-                return ModerationService._create_default_response(reasons=['Config file error'])
-            
             # 调用OpenAI API
             current_app.logger.info("Calling OpenAI Responses API for comment moderation... model=%s", 
                                    current_app.config.get('OPENAI_MODEL', 'gpt-5'))
             
-            response = client.responses.create(
-                model=current_app.config.get('OPENAI_MODEL', 'gpt-5'),
-                input=f"{prompt_content}\n\n用户内容：\n{content}",
-                reasoning={'effort': 'minimal'},
-                text={
-                    'verbosity': 'low',
-                    'format': {
-                        'type': 'json_schema',
-                        'name': schema_content.get('name', 'CommentPIIModeration'),
-                        'schema': schema_content.get('schema', {}),
-                        'strict': bool(schema_content.get('strict', False)),
-                    },
-                },
-                timeout=current_app.config.get('OPENAI_API_TIMEOUT', 30),
-            )
-            
-            # 解析响应
-            result = None
-            try:
-                output_text = getattr(response, 'output_text', None)
-                if output_text:
-                    result = json.loads(output_text)
-            except Exception:
-                result = None
-                
-            if result is None:
-                try:
-                    output = getattr(response, 'output', None)
-                    if output:
-                        for item in output:
-                            contents = getattr(item, 'content', [])
-                            for content_item in contents:
-                                content_json = getattr(content_item, 'json', None)
-                                if content_json is not None:
-                                    result = content_json
-                                    break
-                            if result is not None:
-                                break
-                except Exception:
-                    result = None
-            
-            if result is None:
-                raise json.JSONDecodeError("No JSON output found", doc=str(response), pos=0)
+            result = ModerationService._moderate('comment', prompt_content, schema_content, content)
             
             # 记录审核日志
             current_app.logger.info(f"Comment moderation result: {result.get('action', 'UNKNOWN')}")
             
-            return ModerationService._validate_response(result)
+            result = ModerationService._validate_response(result)
+            ModerationCacheService.set(cache_key, result)
+            return result
             
-        except openai.APITimeoutError:
+        except CircuitOpenError as e:
+            current_app.logger.warning(f"Moderation circuit open for comment: {e}")
+            return ModerationService._create_degraded_response('Circuit open')
+        except ClientBusyError:
+            current_app.logger.error("OpenAI concurrency limit reached for comment")
+            return ModerationService._create_degraded_response('Concurrency limit')
+        except (openai.APITimeoutError, FuturesTimeoutError):
             current_app.logger.error("OpenAI API timeout for comment")
-            return ModerationService._create_default_response(reasons=['API timeout'])
+            return ModerationService._create_degraded_response('API timeout')
         except openai.APIError as e:
             current_app.logger.error(f"OpenAI API error for comment: {e}")
-            return ModerationService._create_default_response(reasons=['API error'])
+            return ModerationService._create_degraded_response('API error')
         except json.JSONDecodeError as e:
             current_app.logger.error(f"Failed to parse OpenAI response for comment: {e}")
             return ModerationService._create_default_response(reasons=['Response parse error'])
@@ -0,0 +1,247 @@
+"""
+Micro-batching moderation dispatcher for NYU CLASS Professor Review System
+
+Concurrent moderation requests in one process are collected for a short
+window (MODERATION_BATCH_WINDOW_MS, at most MODERATION_BATCH_MAX_ITEMS per
+batch) and sent to the Responses API as one structured multi-item prompt.
+The per-item verdicts are fanned back to the waiting callers through
+concurrent.futures.Future objects. A single dispatcher thread only
+collects and groups items; each batch is sent from a ThreadPoolExecutor
+sized to OPENAI_MAX_CONCURRENCY, so several batches can be in flight at
+once, bounded by the same limit as the openai_client slot semaphore. Items
+the model leaves out of a batch answer are handed back to their caller,
+which re-sends them individually on its own thread, and an API error fails
+every item of the batch so each caller falls back exactly like a single
+call would. A caller that gives up waiting cancels its item, and batches
+drop cancelled items before calling the API.
+
+Batches only combine requests that share the same prompt and schema
+(content vs. comment moderation). The dispatcher thread and executor are
+started lazily, i.e. after gunicorn forks its workers, and recreated in a
+forked child.
+"""
+
+import os
+import copy
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from flask import current_app
+
+# 批量回答中缺失该条目：由调用方在自己的线程中单独补审
+_MISSING = object()
+
+
+class _BatchItem:
+    """一条待审核内容及其等待结果的Future"""
+
+    __slots__ = ('app', 'group', 'prompt', 'schema', 'text', 'request_func', 'future')
+
+    def __init__(self, app, group, prompt, schema, text, request_func):
+        self.app = app
+        self.group = group
+        self.prompt = prompt
+        self.schema = schema
+        self.text = text
+        self.request_func = request_func
+        self.future = Future()
+
+
+class ModerationBatchService:
+    """Per-process dispatcher that batches concurrent moderation calls"""
+
+    _queue = None
+    _thread = None
+    _executor = None
+    _pid = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def enabled() -> bool:
+        return current_app.config.get('MODERATION_BATCH_ENABLED', False)
+
+    @staticmethod
+    def _ensure_worker() -> queue.Queue:
+        """按需启动调度线程和发送线程池（fork 后的子进程会重新创建队列、线程和线程池）"""
+        pid = os.getpid()
+        thread = ModerationBatchService._thread
+        if ModerationBatchService._pid == pid and thread is not None and thread.is_alive():
+            return ModerationBatchService._queue
+        with ModerationBatchService._lock:
+            thread = ModerationBatchService._thread
+            if ModerationBatchService._pid != pid or thread is None or not thread.is_alive():
+                ModerationBatchService._queue = queue.Queue()
+                # 线程数与 openai_client 的并发名额一致，发送批次时不会超出进程并发上限
+                ModerationBatchService._executor = ThreadPoolExecutor(
+                    max_workers=max(1, current_app.config.get('OPENAI_MAX_CONCURRENCY', 8)),
+                    thread_name_prefix='moderation-batch',
+                )
+                ModerationBatchService._thread = threading.Thread(
+                    target=ModerationBatchService._run,
+                    args=(ModerationBatchService._queue, ModerationBatchService._executor),
+                    name='moderation-batcher',
+                    daemon=True,
+                )
+                ModerationBatchService._thread.start()
+                ModerationBatchService._pid = pid
+            return ModerationBatchService._queue
+
+    @staticmethod
+    def submit(group: str, prompt: str, schema: dict, text: str, request_func) -> Future:
+        """
+        提交一条审核请求，返回 Future。
+        request_func(input_text, schema) 负责实际调用接口并返回解析后的JSON（失败时抛出异常）
+        """
+        item = _BatchItem(current_app._get_current_object(), group, prompt, schema, text, request_func)
+        ModerationBatchService._ensure_worker().put(item)
+        return item.future
+
+    @staticmethod
+    def moderate(group: str, prompt: str, schema: dict, text: str, request_func) -> dict:
+        """
+        提交并等待审核结果；接口异常原样抛给调用方。
+        批量回答遗漏该条目时在调用方线程中单独补审
+        """
+        future = ModerationBatchService.submit(group, prompt, schema, text, request_func)
+        # 等待窗口 + 并发名额等待 + 一次批量调用
+        timeout = current_app.config.get('OPENAI_API_TIMEOUT', 30) + \
+            current_app.config.get('MODERATION_BATCH_WINDOW_MS', 50) / 1000.0 + \
+            current_app.config.get('OPENAI_SLOT_TIMEOUT', 10)
+        try:
+            result = future.result(timeout=timeout)
+        except FuturesTimeoutError:
+            # 尚未发送的条目会被批次丢弃，不再占用接口调用
+            future.cancel()
+            raise
+        if result is _MISSING:
+            return request_func(ModerationBatchService.single_input(prompt, text), schema)
+        return result
+
+    @staticmethod
+    def _run(items_queue: queue.Queue, executor: ThreadPoolExecutor) -> None:
+        """调度线程：收集一个时间窗口内的请求，按提示词/schema分组后交给线程池发送"""
+        while True:
+            first = items_queue.get()
+            with first.app.app_context():
+                window = current_app.config.get('MODERATION_BATCH_WINDOW_MS', 50) / 1000.0
+                max_items = max(1, current_app.config.get('MODERATION_BATCH_MAX_ITEMS', 8))
+
+            pending = [first]
+            deadline = time.monotonic() + window
+            while len(pending) < max_items:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    pending.append(items_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            groups = {}
+            for item in pending:
+                groups.setdefault((id(item.app), item.group), []).append(item)
+            for items in groups.values():
+                executor.submit(ModerationBatchService._dispatch_in_context, items)
+
+    @staticmethod
+    def _dispatch_in_context(items: list) -> None:
+        """线程池中执行：在提交方的应用上下文中发送一个批次"""
+        with items[0].app.app_context():
+            ModerationBatchService._dispatch(items)
+
+    @staticmethod
+    def _dispatch(items: list) -> None:
+        """发送一个批次并把结果分发给各个Future（调用方已放弃等待的条目不再发送）"""
+        items = [item for item in items if item.future.set_running_or_notify_cancel()]
+        if not items:
+            return
+        try:
+            if len(items) == 1:
+                item = items[0]
+                item.future.set_result(item.request_func(ModerationBatchService.single_input(item.prompt, item.text), item.schema))
+                return
+
+            results = ModerationBatchService._request_batch(items)
+            current_app.logger.info(
+                f"Batched moderation: group={items[0].group}, items={len(items)}, answered={len(results)}"
+            )
+            for index, item in enumerate(items):
+                result = results.get(index)
+                # 模型遗漏或格式错误的条目交回调用方单独补审
+                item.future.set_result(result if isinstance(result, dict) else _MISSING)
+        except Exception as e:
+            for item in items:
+                if not item.future.done():
+                    item.future.set_exception(e)
+
+    @staticmethod
+    def single_input(prompt: str, text: str) -> str:
+        """单条内容的审核输入"""
+        return f"{prompt}\n\n用户内容：\n{text}"
+
+    @staticmethod
+    def batch_schema(schema: dict) -> dict:
+        """把单条审核的 schema 包装为 {results: [{index, result}]} 的批量 schema"""
+        item_schema = copy.deepcopy(schema.get('schema', {}))
+        item_schema.pop('$schema', None)
+        item_schema.pop('title', None)
+        return {
+            'name': f"{schema.get('name', 'Moderation')}Batch",
+            'strict': bool(schema.get('strict', False)),
+            'schema': {
+                'type': 'object',
+                'additionalProperties': False,
+                'required': ['results'],
+                'properties': {
+                    'results': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'additionalProperties': False,
+                            'required': ['index', 'result'],
+                            'properties': {
+                                'index': {'type': 'integer', 'minimum': 0},
+                                'result': item_schema,
+                            },
+                        },
+                    },
+                },
+            },
+        }
+
+    @staticmethod
+    def batch_input(prompt: str, texts: list) -> str:
+        """构造多条内容的审核输入，每条内容用带序号的标签分隔"""
+        parts = [
+            prompt,
+            f"【批量审核】以下共有 {len(texts)} 条互不相关的用户内容，分别以 <item index=\"序号\"> 标记。"
+            "请按上述规则逐条独立审核，偏移量以该条内容自身为准；"
+            "在 results 中为每条内容各输出一个对象，index 与输入序号一致，result 为该条内容的审核结果。",
+        ]
+        for index, text in enumerate(texts):
+            parts.append(f"<item index=\"{index}\">\n{text}\n</item>")
+        return "\n\n".join(parts)
+
+    @staticmethod
+    def _request_batch(items: list) -> dict:
+        """一次接口调用审核整个批次，返回 {序号: 审核结果}"""
+        first = items[0]
+        response = first.request_func(
+            ModerationBatchService.batch_input(first.prompt, [item.text for item in items]),
+            ModerationBatchService.batch_schema(first.schema),
+        )
+        results = {}
+        for entry in response.get('results') or []:
+            if not isinstance(entry, dict):
+                continue
+            index = entry.get('index')
+            if isinstance(index, int) and 0 <= index < len(items) and index not in results:
+                results[index] = entry.get('result')
+        return results
+
+
+# Convenience functions
+def batch_moderate(group: str, prompt: str, schema: dict, text: str, request_func) -> dict:
+    """Convenience function for moderating one text through the batch dispatcher"""
+    return ModerationBatchService.moderate(group, prompt, schema, text, request_func)
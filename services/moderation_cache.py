@@ -0,0 +1,136 @@
+"""
+Moderation result cache for NYU CLASS Professor Review System
+
+This module caches moderation verdicts keyed by (prompt version, schema
+version, SHA-256 of the sanitized text). A per-process LRU (TTLCache) answers
+repeats within one worker; the moderation_cache table shares verdicts across
+gunicorn workers and restarts. The prompt version also covers the model
+name, so editing Prompt.txt / the schema or switching OPENAI_MODEL starts a
+fresh keyspace instead of serving stale verdicts. Only real API verdicts are
+stored, never the fallback responses returned on errors.
+"""
+
+import json
+import random
+import hashlib
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, delete
+from sqlalchemy.dialects import postgresql, sqlite
+from models import get_models
+from utils.cache import TTLCache, MISSING
+
+# 每次写入时以此概率顺带清理过期记录
+PURGE_PROBABILITY = 0.01
+
+
+def _short_hash(value: str) -> str:
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()[:16]
+
+
+class ModerationCacheService:
+    """Service for the two-tier moderation verdict cache"""
+
+    # key: (content_hash, prompt_version, schema_version) -> 审核结果JSON字符串
+    _cache = TTLCache(maxsize=2048)
+
+    @staticmethod
+    def make_key(prompt: str, schema: dict, text: str) -> tuple:
+        """由提示词、schema和文本计算缓存键"""
+        model = current_app.config.get('OPENAI_MODEL', 'gpt-5')
+        return (
+            hashlib.sha256(text.encode('utf-8')).hexdigest(),
+            _short_hash(f"{model}\n{prompt}"),
+            _short_hash(json.dumps(schema, sort_keys=True, ensure_ascii=False)),
+        )
+
+    @staticmethod
+    def _enabled() -> bool:
+        return current_app.config.get('MODERATION_CACHE_ENABLED', True)
+
+    @staticmethod
+    def get(key: tuple):
+        """返回缓存的审核结果（每次返回新的dict），未命中时返回 None"""
+        if not ModerationCacheService._enabled():
+            return None
+        raw = ModerationCacheService._cache.get(key)
+        if raw is MISSING:
+            raw = ModerationCacheService._load(key)
+            if raw is None:
+                return None
+            ModerationCacheService._cache.set(key, raw, ttl=current_app.config.get('MODERATION_CACHE_TTL', 3600))
+        return json.loads(raw)
+
+    @staticmethod
+    def set(key: tuple, result: dict) -> None:
+        """保存审核结果到两级缓存；数据库写入失败只记录日志"""
+        if not ModerationCacheService._enabled():
+            return
+        raw = json.dumps(result, ensure_ascii=False)
+        ModerationCacheService._cache.set(key, raw, ttl=current_app.config.get('MODERATION_CACHE_TTL', 3600))
+        try:
+            ModerationCacheService._store(key, raw)
+        except Exception as e:
+            current_app.logger.warning(f"写入审核缓存失败: {e}")
+
+    @staticmethod
+    def _load(key: tuple):
+        """从共享表读取未过期的结果。使用独立连接，不影响调用方的事务"""
+        db = current_app.extensions['sqlalchemy']
+        Entry = get_models()['ModerationCacheEntry']
+        content_hash, prompt_version, schema_version = key
+        cutoff = datetime.utcnow() - timedelta(days=current_app.config.get('MODERATION_CACHE_DB_TTL_DAYS', 30))
+        try:
+            with db.engine.connect() as conn:
+                return conn.execute(
+                    select(Entry.result).where(
+                        Entry.content_hash == content_hash,
+                        Entry.prompt_version == prompt_version,
+                        Entry.schema_version == schema_version,
+                        Entry.created_at > cutoff,
+                    )
+                ).scalar()
+        except Exception as e:
+            current_app.logger.warning(f"读取审核缓存失败: {e}")
+            return None
+
+    @staticmethod
+    def _store(key: tuple, raw: str) -> None:
+        """在独立事务中写入共享表（并发写入同一键时保留先写入的结果）"""
+        db = current_app.extensions['sqlalchemy']
+        Entry = get_models()['ModerationCacheEntry']
+        content_hash, prompt_version, schema_version = key
+        dialect = sqlite if db.engine.dialect.name == 'sqlite' else postgresql
+        now = datetime.utcnow()
+        cutoff = now - timedelta(days=current_app.config.get('MODERATION_CACHE_DB_TTL_DAYS', 30))
+        table = Entry.__table__
+
+        with db.engine.begin() as conn:
+            stmt = dialect.insert(table).values(
+                content_hash=content_hash, prompt_version=prompt_version,
+                schema_version=schema_version, result=raw, created_at=now
+            )
+            # 已过期的结果直接覆盖，未过期的保留
+            conn.execute(stmt.on_conflict_do_update(
+                index_elements=['content_hash', 'prompt_version', 'schema_version'],
+                set_={'result': stmt.excluded.result, 'created_at': stmt.excluded.created_at},
+                where=table.c.created_at <= cutoff,
+            ))
+            if random.random() < PURGE_PROBABILITY:
+                conn.execute(delete(table).where(table.c.created_at <= cutoff))
+
+    @staticmethod
+    def clear() -> None:
+        """清空本进程的缓存层（共享表保留）"""
+        ModerationCacheService._cache.clear()
+
+
+# Convenience functions
+def get_cached_moderation(key: tuple):
+    """Convenience function for a cached moderation verdict lookup"""
+    return ModerationCacheService.get(key)
+
+
+def cache_moderation(key: tuple, result: dict) -> None:
+    """Convenience function for storing a moderation verdict"""
+    ModerationCacheService.set(key, result)
@@ -0,0 +1,306 @@
+"""
+Local moderation pre-filter for NYU CLASS Professor Review System
+
+This module runs compiled rules in front of the LLM moderation call:
+PII regexes derived from Prompt.txt / Comment Prompt.txt (mainland mobile
+numbers, e-mail addresses, WeChat/QQ IDs, resident ID numbers with a valid
+checksum, Luhn-valid card numbers) and an Aho-Corasick keyword scan for
+everything the rules cannot decide on their own (name triggers, address
+and contact hints, threats, abuse). Each text gets one of three outcomes:
+
+- a definite FLAG_AND_FIX when a PII pattern matches (no network call);
+- a definite ALLOW only for short text made up entirely of a fixed
+  vocabulary of generic, PII-free review words (ALLOW_VOCABULARY) plus
+  punctuation and emoji (no network call). Anything else -- a possible
+  name, place, digit, Latin word or insult -- is not in the vocabulary;
+- None for everything else, which falls through to the LLM.
+
+The whole pre-filter is off by default (MODERATION_PREFILTER_ENABLED),
+and the local ALLOW has its own switch (MODERATION_PREFILTER_ALLOW_ENABLED)
+that should only be turned on after benchmark_prefilter.py reports zero
+false ALLOWs on labelled data. The placeholder whitelist from the prompts
+(138-0000-0000, example.com) is honoured. Local verdicts follow the same
+JSON schema as the API results and are not written to the moderation cache.
+"""
+
+import re
+import unicodedata
+from flask import current_app
+from utils.keyword_matcher import KeywordMatcher
+
+# PII 类型 -> client_notice 中的类别名（与 Comment Prompt.txt 的固定句式一致）
+PII_NOTICE_NAMES = {
+    'CONTACT_PHONE': '手机号',
+    'CONTACT_EMAIL': '邮箱',
+    'CONTACT_HANDLE': '账号',
+    'ID_DOC': '证件号',
+    'BANK_OR_PAYMENT': '银行卡号',
+}
+
+# PII 类型 -> 评价审核 schema 中的问题标签
+PII_VIOLATIONS = {
+    'CONTACT_PHONE': 'DOXXING_INTENT',
+    'CONTACT_EMAIL': 'DOXXING_INTENT',
+    'CONTACT_HANDLE': 'DOXXING_INTENT',
+    'ID_DOC': 'ILLEGAL_HIGH_RISK_PII',
+    'BANK_OR_PAYMENT': 'ILLEGAL_HIGH_RISK_PII',
+}
+
+# 需要交给模型判断的关键词：标签 -> 关键词
+HINT_KEYWORDS = {
+    'contact': [
+        '微信', '威信', 'v信', 'vx', 'wx', 'wechat', 'weixin', 'qq', '扣扣', '电话', '手机', '号码',
+        '联系方式', '加我', '私聊', '邮箱', 'email', 'e-mail', 'telegram', 'instagram', 'ins号',
+        '抖音号', '小红书号', '微博号', 'discord', '@',
+    ],
+    'address': [
+        '住址', '地址', '住在', '家住', '门牌', '号楼', '单元', '宿舍', '寝室', '小区', '公寓', '房间号',
+    ],
+    'document': [
+        '身份证', '护照', '证件', '社保', '银行卡', '卡号', '支付宝', '收款码', '车牌',
+    ],
+    'name': [
+        '叫', '名叫', '名字', '姓名', '本名', '真名', '名为', '全名',
+    ],
+    'threat': [
+        '杀了', '杀你', '弄死', '砍死', '捅死', '打死', '炸死', '去死', '同归于尽', '报复', '泼硫酸',
+    ],
+    'abuse': [
+        '傻逼', '煞笔', '傻b', '傻x', 'sb', '脑残', '贱人', '婊子', '人渣', '畜生', '狗东西', '废物',
+        '垃圾人', '神经病', '操你', '妈的', 'cnm', 'nmsl', '滚',
+    ],
+}
+
+# 各审核类型需要关注的关键词标签（评论审核只处理隐私，不判断辱骂）
+GROUP_HINT_LABELS = {
+    'content': {'contact', 'address', 'document', 'name', 'threat', 'abuse'},
+    'comment': {'contact', 'address', 'document', 'name'},
+}
+
+# 本地放行的词表：文本去掉标点、空白和表情后必须能完全由这些词拼出。
+# 只收录不含人名、地点、侮辱含义的通用评价用语；单字词不得是常见姓氏，
+# 双字词不收录可作人名的组合（如“温柔”“严格”），避免“姓+名”被词表拼出
+ALLOW_VOCABULARY = frozenset([
+    # 指代
+    '老师', '教授', '这门课', '这节课', '课程', '课', '这个', '这', '我们', '我', '大家', '同学', '人',
+    # 程度与语气
+    '非常', '特别', '超级', '超', '真的', '真', '很', '挺', '太', '最', '比较', '也', '都', '还', '更',
+    '的', '了', '啊', '呀', '吧', '呢', '哦', '嗯', '哈', '嘿', '是', '不', '没有', '有', '一个', '一',
+    # 评价
+    '好', '棒', '赞', '不错', '优秀', '认真', '负责', '耐心', '有趣', '幽默', '专业', '清楚', '清晰',
+    '友好', '热情', '靠谱', '有用', '实用', '推荐', '支持', '同意', '感谢', '谢谢', '喜欢', '好评',
+    '一般', '还行', '可以', '简单', '容易', '轻松', '值得', '收获', '学到', '很多', '东西',
+    # 课程相关
+    '讲课', '上课', '课堂', '作业', '考试', '内容', '氛围', '给分', '选', '听',
+    # 常见英文缩写与语气词
+    'nyu', 'lol', 'omg', 'emm', 'hhh',
+])
+_ALLOW_WORD_MAX = max(len(word) for word in ALLOW_VOCABULARY)
+
+PHONE_RE = re.compile(r'(?<![\d])(?:(?:\+|＋)?86[\s-]?)?1[3-9]\d(?:[\s.\-]?\d){8}(?!\d)')
+EMAIL_RE = re.compile(r'[A-Za-z0-9._%+\-]+@[A-Za-z0-9\-]+(?:\.[A-Za-z0-9\-]+)*\.[A-Za-z]{2,}')
+WECHAT_RE = re.compile(
+    r'(?<![A-Za-z])(?:微信号?|威信|v信|vx|wx|wechat|weixin)\s*(号)?\s*([:：])?\s*([A-Za-z][\-_A-Za-z0-9]{5,19})(?![\-_A-Za-z0-9])',
+    re.IGNORECASE,
+)
+QQ_RE = re.compile(r'(?<![A-Za-z])(?:qq|扣扣)\s*号?\s*[:：]?\s*([1-9]\d{4,10})(?!\d)', re.IGNORECASE)
+ID_CARD_RE = re.compile(r'(?<!\d)[1-9]\d{5}(?:19|20)\d{2}(?:0[1-9]|1[0-2])(?:0[1-9]|[12]\d|3[01])\d{3}[\dXx](?![\dA-Za-z])')
+CARD_RE = re.compile(r'(?<!\d)[3-6]\d{3}(?:[\s\-]?\d){11,15}(?!\d)')
+
+# 提示词白名单中的占位信息
+PLACEHOLDER_EMAIL_DOMAINS = ('example.com', 'example.org', 'example.net', 'test.com')
+
+ID_CARD_WEIGHTS = (7, 9, 10, 5, 8, 4, 2, 1, 6, 3, 7, 9, 10, 5, 8, 4, 2)
+ID_CARD_CHECK = '10X98765432'
+
+
+def _digits(value: str) -> str:
+    return ''.join(ch for ch in value if ch.isdigit())
+
+
+def _is_placeholder_number(digits: str) -> bool:
+    """占位号码：号段之后全为同一数字，或为连续递增/递减数字（如 138-0000-0000、12345678）"""
+    tail = digits[-8:]
+    if len(set(tail)) == 1:
+        return True
+    steps = {int(b) - int(a) for a, b in zip(tail, tail[1:])}
+    return steps in ({1}, {-1})
+
+
+def _made_of_vocabulary(text: str) -> bool:
+    """文本去掉标点、空白和表情后能否按最长匹配完全切分为 ALLOW_VOCABULARY 中的词"""
+    text = text.lower()
+    index = 0
+    while index < len(text):
+        category = unicodedata.category(text[index])
+        if category[0] in 'PZ' or category == 'So':
+            index += 1
+            continue
+        for size in range(min(_ALLOW_WORD_MAX, len(text) - index), 0, -1):
+            if text[index:index + size] in ALLOW_VOCABULARY:
+                index += size
+                break
+        else:
+            return False
+    return True
+
+
+def _valid_id_card(value: str) -> bool:
+    total = sum(int(ch) * weight for ch, weight in zip(value[:17], ID_CARD_WEIGHTS))
+    return ID_CARD_CHECK[total % 11] == value[17].upper()
+
+
+def _valid_luhn(digits: str) -> bool:
+    total = 0
+    for index, ch in enumerate(reversed(digits)):
+        value = int(ch)
+        if index % 2:
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return total % 10 == 0
+
+
+class ModerationPrefilterService:
+    """Service for rule-based moderation verdicts without an API call"""
+
+    _matcher = KeywordMatcher(
+        (keyword, label) for label, keywords in HINT_KEYWORDS.items() for keyword in keywords
+    )
+
+    @staticmethod
+    def enabled() -> bool:
+        return current_app.config.get('MODERATION_PREFILTER_ENABLED', False)
+
+    @staticmethod
+    def allow_enabled() -> bool:
+        return current_app.config.get('MODERATION_PREFILTER_ALLOW_ENABLED', False)
+
+    @staticmethod
+    def find_pii(text: str) -> list:
+        """返回确定的PII片段 [{type, text, start, end, confidence}]，按位置排序且互不重叠"""
+        findings = []
+
+        def add(pii_type, start, end, confidence):
+            if any(start < f['end'] and f['start'] < end for f in findings):
+                return
+            findings.append({
+                'type': pii_type, 'text': text[start:end],
+                'start': start, 'end': end, 'confidence': confidence,
+            })
+
+        # 证件号、银行卡号优先于手机号等较短的模式
+        for match in ID_CARD_RE.finditer(text):
+            if _valid_id_card(match.group()):
+                add('ID_DOC', match.start(), match.end(), 0.95)
+        for match in CARD_RE.finditer(text):
+            digits = _digits(match.group())
+            if 16 <= len(digits) <= 19 and _valid_luhn(digits) and not _is_placeholder_number(digits):
+                add('BANK_OR_PAYMENT', match.start(), match.end(), 0.9)
+        for match in PHONE_RE.finditer(text):
+            if not _is_placeholder_number(_digits(match.group())):
+                add('CONTACT_PHONE', match.start(), match.end(), 0.95)
+        for match in EMAIL_RE.finditer(text):
+            if not match.group().lower().endswith(PLACEHOLDER_EMAIL_DOMAINS):
+                add('CONTACT_EMAIL', match.start(), match.end(), 0.95)
+        for match in WECHAT_RE.finditer(text):
+            handle = match.group(3)
+            # 没有“号/冒号”时只接受含数字或符号的ID，避免把“微信 chatting”之类的英文单词当作账号
+            if match.group(1) or match.group(2) or not handle.isalpha():
+                add('CONTACT_HANDLE', match.start(3), match.end(3), 0.9)
+        for match in QQ_RE.finditer(text):
+            add('CONTACT_HANDLE', match.start(1), match.end(1), 0.9)
+
+        findings.sort(key=lambda f: f['start'])
+        return findings
+
+    @staticmethod
+    def is_low_risk(group: str, text: str) -> bool:
+        """完全由放行词表组成、且没有任何需要模型判断的关键词的短文本"""
+        if not text.strip() or len(text) > current_app.config.get('MODERATION_PREFILTER_ALLOW_MAX_CHARS', 60):
+            return False
+        labels = ModerationPrefilterService._matcher.labels(text)
+        if labels & GROUP_HINT_LABELS.get(group, GROUP_HINT_LABELS['content']):
+            return False
+        return _made_of_vocabulary(text)
+
+    @staticmethod
+    def _schema_version(schema: dict, default: str) -> str:
+        try:
+            return schema['schema']['properties']['version']['enum'][0]
+        except (KeyError, IndexError, TypeError):
+            return default
+
+    @staticmethod
+    def _mask(text: str, findings: list) -> str:
+        """只替换命中的片段，其余文字逐字保留"""
+        parts, last = [], 0
+        for finding in findings:
+            parts.append(text[last:finding['start']])
+            parts.append(f"[{PII_NOTICE_NAMES[finding['type']]}已隐去]")
+            last = finding['end']
+        parts.append(text[last:])
+        return ''.join(parts)
+
+    @staticmethod
+    def _verdict(group: str, schema: dict, text: str, findings: list) -> dict:
+        """按对应 schema 的字段构造审核结果"""
+        if findings:
+            names = []
+            for finding in findings:
+                name = PII_NOTICE_NAMES[finding['type']]
+                if name not in names:
+                    names.append(name)
+            action, client_notice = 'FLAG_AND_FIX', f"请移除{'、'.join(names)}"
+        else:
+            action, client_notice = 'ALLOW', ''
+
+        if group == 'comment':
+            return {
+                'version': ModerationPrefilterService._schema_version(schema, '1.1'),
+                'action': action,
+                'pii_findings': findings,
+                'client_notice': client_notice,
+            }
+
+        violations = []
+        for finding in findings:
+            violation = PII_VIOLATIONS[finding['type']]
+            if violation not in violations:
+                violations.append(violation)
+        return {
+            'version': ModerationPrefilterService._schema_version(schema, '1.3'),
+            'action': action,
+            'pii_findings': findings,
+            'violations': violations,
+            # schema 要求 FLAG_AND_FIX 时为对象；本地规则不评估细节，按最保守的取值填写
+            'evidence_check': {
+                'is_specific_enough': False,
+                'detail_score': 0,
+                'extracted_behaviors': [],
+            } if findings else None,
+            'safe_suggestion': ModerationPrefilterService._mask(text, findings) if findings else '',
+            'client_notice': client_notice,
+        }
+
+    @staticmethod
+    def check(group: str, schema: dict, text: str):
+        """
+        本地规则审核：group 为 'content' 或 'comment'。
+        能确定结论时返回与接口结果同结构的字典，否则返回 None（交给模型审核）
+        """
+        if not ModerationPrefilterService.enabled():
+            return None
+        findings = ModerationPrefilterService.find_pii(text)
+        if findings:
+            return ModerationPrefilterService._verdict(group, schema, text, findings)
+        if ModerationPrefilterService.allow_enabled() and ModerationPrefilterService.is_low_risk(group, text):
+            return ModerationPrefilterService._verdict(group, schema, text, [])
+        return None
+
+
+# Convenience functions
+def prefilter_moderation(group: str, schema: dict, text: str):
+    """Convenience function for a local rule-based moderation verdict"""
+    return ModerationPrefilterService.check(group, schema, text)
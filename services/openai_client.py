@@ -0,0 +1,161 @@
+"""
+Shared OpenAI client for NYU CLASS Professor Review System
+
+This module keeps one configured openai.OpenAI client per process, backed
+by a persistent keep-alive connection pool (HTTP/2 when the optional h2
+package is installed), so moderation calls reuse warm TLS connections
+instead of paying DNS + TCP + TLS setup on every request. A semaphore caps
+concurrent in-flight calls per process, and prompt/schema files are cached
+in memory and only re-read when their mtime changes.
+
+The client is created lazily on first use, i.e. after gunicorn forks its
+workers, so no connection pool is shared across processes.
+"""
+
+import os
+import json
+import threading
+from contextlib import contextmanager
+import httpx
+import openai
+from flask import current_app
+
+try:
+    import h2  # noqa: F401  HTTP/2 为可选依赖（pip install h2）
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class ClientBusyError(Exception):
+    """等待并发名额超时（本进程已有 OPENAI_MAX_CONCURRENCY 个请求在进行中）"""
+
+
+class OpenAIClientManager:
+    """Per-process manager for the pooled OpenAI client and prompt files"""
+
+    _client = None
+    _client_settings = None
+    _semaphore = None
+    _semaphore_size = None
+    _lock = threading.Lock()
+
+    # path -> (mtime_ns, 内容)
+    _files = {}
+    _files_lock = threading.Lock()
+
+    @staticmethod
+    def _settings() -> tuple:
+        config = current_app.config
+        return (
+            config.get('OPENAI_API_KEY'),
+            config.get('OPENAI_BASE_URL'),
+            config.get('OPENAI_API_TIMEOUT', 30),
+            config.get('OPENAI_MAX_CONCURRENCY', 8),
+            config.get('OPENAI_KEEPALIVE_EXPIRY', 60),
+            config.get('OPENAI_HTTP2', True) and HTTP2_AVAILABLE,
+            config.get('OPENAI_CLEAR_PROXIES', False),
+            config.get('OPENAI_USE_CUSTOM_HTTP_CLIENT', False),
+            config.get('OPENAI_MAX_RETRIES', 0),
+        )
+
+    @staticmethod
+    def _build_client(settings: tuple):
+        api_key, base_url, timeout, max_concurrency, keepalive_expiry, http2, clear_proxies, custom_http, max_retries = settings
+        http_options = dict(
+            # 连接池大小与并发上限一致：每个在途请求都能复用一条保持的连接
+            limits=httpx.Limits(
+                max_connections=max_concurrency,
+                max_keepalive_connections=max_concurrency,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 10)),
+            http2=http2,
+            # 忽略 HTTP(S)_PROXY 等环境变量
+            trust_env=not clear_proxies,
+        )
+        if custom_http:
+            http_client = httpx.Client(**http_options)
+        else:
+            # SDK默认客户端（保留其重定向等默认设置），只替换连接池参数
+            http_client = openai.DefaultHttpxClient(**http_options)
+
+        # SDK 默认会重试2次，超时时单次审核最长可达 3 倍 OPENAI_API_TIMEOUT；失败由熔断器和补审处理
+        kwargs = {'api_key': api_key, 'http_client': http_client, 'max_retries': max_retries}
+        if base_url:
+            kwargs['base_url'] = base_url
+        return openai.OpenAI(**kwargs)
+
+    @staticmethod
+    def get_client():
+        """返回本进程共享的OpenAI客户端，未配置API key时返回 None；配置变化时重建"""
+        settings = OpenAIClientManager._settings()
+        if not settings[0]:
+            return None
+        client = OpenAIClientManager._client
+        if client is not None and OpenAIClientManager._client_settings == settings:
+            return client
+
+        with OpenAIClientManager._lock:
+            if OpenAIClientManager._client is None or OpenAIClientManager._client_settings != settings:
+                old_client = OpenAIClientManager._client
+                OpenAIClientManager._client = OpenAIClientManager._build_client(settings)
+                OpenAIClientManager._client_settings = settings
+                OpenAIClientManager._semaphore = threading.BoundedSemaphore(settings[3])
+                OpenAIClientManager._semaphore_size = settings[3]
+                if old_client is not None:
+                    old_client.close()
+            return OpenAIClientManager._client
+
+    @staticmethod
+    @contextmanager
+    def slot():
+        """占用一个并发名额；等待超过 OPENAI_SLOT_TIMEOUT 秒时抛出 ClientBusyError"""
+        semaphore = OpenAIClientManager._semaphore
+        if semaphore is None:
+            yield
+            return
+        if not semaphore.acquire(timeout=current_app.config.get('OPENAI_SLOT_TIMEOUT', 10)):
+            raise ClientBusyError("OpenAI concurrency limit reached")
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+    @staticmethod
+    def _read_cached(path: str, parse):
+        """读取文件并缓存解析结果，mtime 未变化时直接返回缓存"""
+        mtime = os.stat(path).st_mtime_ns
+        cached = OpenAIClientManager._files.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with open(path, 'r', encoding='utf-8') as f:
+            content = parse(f.read())
+        with OpenAIClientManager._files_lock:
+            OpenAIClientManager._files[path] = (mtime, content)
+        return content
+
+    @staticmethod
+    def load_prompt_files(prompt_filename: str, schema_filename: str) -> tuple:
+        """返回 (提示词文本, schema字典)；文件位于应用根目录，修改后自动重新加载"""
+        prompt_path = os.path.join(current_app.root_path, prompt_filename)
+        schema_path = os.path.join(current_app.root_path, schema_filename)
+        prompt_content = OpenAIClientManager._read_cached(prompt_path, lambda raw: raw)
+        schema_content = OpenAIClientManager._read_cached(schema_path, json.loads)
+        return prompt_content, schema_content
+
+
+# Convenience functions
+def get_openai_client():
+    """Convenience function for the shared per-process OpenAI client"""
+    return OpenAIClientManager.get_client()
+
+
+def openai_slot():
+    """Convenience function for holding one OpenAI concurrency slot"""
+    return OpenAIClientManager.slot()
+
+
+def load_prompt_files(prompt_filename: str, schema_filename: str) -> tuple:
+    """Convenience function for mtime-cached prompt/schema loading"""
+    return OpenAIClientManager.load_prompt_files(prompt_filename, schema_filename)
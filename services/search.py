@@ -0,0 +1,196 @@
+"""
+Professor search service for NYU CLASS Professor Review System
+
+This module maintains the normalized search keys of each submission's
+identity fields (Chinese name, English name, unique identifier) and answers
+homepage exact-match search with a single lookup on the indexed key column.
+Result ID lists (including empty ones) are cached per worker, keyed by
+the normalized key and the shared content version (site_stats row). When
+an admin changes a submission the local entries are dropped and the
+version is bumped, so every worker misses on its next lookup.
+Keys are NFKC-normalized, case-folded and whitespace-collapsed; when OpenCC
+is installed and SEARCH_FOLD_TRADITIONAL is enabled, traditional Chinese is
+also folded to simplified.
+"""
+
+import re
+import unicodedata
+from flask import current_app
+from models import get_models
+from services.stats import SiteStatsService, bump_content_version
+from utils.cache import TTLCache, MISSING
+
+try:
+    from opencc import OpenCC
+    _t2s_converter = OpenCC('t2s')
+except Exception:  # opencc 为可选依赖
+    _t2s_converter = None
+
+# 参与搜索的身份字段：键名 -> Submission 属性
+SEARCH_KEY_FIELDS = {
+    'cn_name': 'professor_cn_name',
+    'en_name': 'professor_en_name',
+    'unique_identifier': 'professor_unique_identifier',
+}
+
+MAX_KEY_LENGTH = 255
+MAX_RESULTS = 100
+_whitespace_re = re.compile(r'\s+')
+
+
+def normalize_search_key(value, fold_traditional=None):
+    """
+    将姓名/标识归一化为查找键：NFKC（全角转半角）、casefold、合并空白，
+    可选繁体转简体。空值返回 None
+    """
+    if not value:
+        return None
+    key = unicodedata.normalize('NFKC', value).casefold()
+    key = _whitespace_re.sub(' ', key).strip()
+    if fold_traditional is None:
+        fold_traditional = current_app.config.get('SEARCH_FOLD_TRADITIONAL', True)
+    if fold_traditional and _t2s_converter is not None:
+        key = _t2s_converter.convert(key)
+    return key[:MAX_KEY_LENGTH] or None
+
+
+class SearchService:
+    """Service for normalized professor search keys"""
+
+    # key: (内容版本号, 归一化查找键) -> 已通过提交的ID元组（空元组表示无结果）
+    _cache = TTLCache(maxsize=1024)
+
+    @staticmethod
+    def keys_for(submission) -> set:
+        """返回提交记录当前身份字段对应的查找键集合"""
+        keys = set()
+        for attr in SEARCH_KEY_FIELDS.values():
+            key = normalize_search_key(getattr(submission, attr))
+            if key:
+                keys.add(key)
+        return keys
+
+    @staticmethod
+    def invalidate(keys) -> None:
+        """使这些查找键的缓存结果失效（在提交事务之后调用），并递增共享版本号使其他worker失效"""
+        keys = list(keys)
+        if not keys:
+            return
+        version = SiteStatsService.content_version()
+        for key in keys:
+            SearchService._cache.pop((version, key))
+        bump_content_version()
+
+    @staticmethod
+    def sync_keys(submission):
+        """
+        按提交记录当前的身份字段重写其查找键（不提交事务）。
+        新记录需先 flush 以获得 id
+        """
+        db = current_app.extensions['sqlalchemy']
+        SubmissionSearchKey = get_models()['SubmissionSearchKey']
+
+        SubmissionSearchKey.query.filter_by(submission_id=submission.id).delete(synchronize_session=False)
+        for field, attr in SEARCH_KEY_FIELDS.items():
+            key = normalize_search_key(getattr(submission, attr))
+            if key:
+                db.session.add(SubmissionSearchKey(submission_id=submission.id, field=field, search_key=key))
+
+    @staticmethod
+    def _lookup_ids(key: str) -> tuple:
+        """按查找键取已通过提交的ID（按更新时间倒序），结果按 (内容版本号, 键) 缓存"""
+        cache_key = (SiteStatsService.content_version(), key)
+        ids = SearchService._cache.get(cache_key)
+        if ids is not MISSING:
+            return ids
+
+        models = get_models()
+        Submission = models['Submission']
+        SubmissionSearchKey = models['SubmissionSearchKey']
+        matched_ids = SubmissionSearchKey.query.with_entities(
+            SubmissionSearchKey.submission_id
+        ).filter(SubmissionSearchKey.search_key == key)
+        ids = tuple(row[0] for row in Submission.query.with_entities(Submission.id).filter(
+            Submission.id.in_(matched_ids.scalar_subquery()),
+            Submission.status == models['ReviewStatus'].APPROVED,
+        ).order_by(Submission.updated_at.desc()).limit(MAX_RESULTS))
+
+        # 无结果的查询也缓存（较短TTL），重复的无效/刷屏查询不再访问数据库
+        if ids:
+            ttl = current_app.config.get('SEARCH_CACHE_TTL', 300)
+        else:
+            ttl = current_app.config.get('SEARCH_NEGATIVE_CACHE_TTL', 60)
+        SearchService._cache.set(cache_key, ids, ttl=ttl)
+        return ids
+
+    @staticmethod
+    def search(q: str, limit: int = MAX_RESULTS):
+        """按归一化键精确查找已通过的提交，按更新时间倒序"""
+        key = normalize_search_key(q)
+        if not key:
+            return []
+        ids = SearchService._lookup_ids(key)[:limit]
+        if not ids:
+            return []
+
+        # 计数等展示字段需要最新值，按主键重新读取行；再次过滤状态以防其他worker的缓存过期
+        models = get_models()
+        Submission = models['Submission']
+        return Submission.query.filter(
+            Submission.id.in_(ids),
+            Submission.status == models['ReviewStatus'].APPROVED,
+        ).order_by(Submission.updated_at.desc()).all()
+
+    @staticmethod
+    def rebuild(batch_size: int = 500) -> int:
+        """重建全部查找键（部署后回填或归一化规则变化时使用），返回处理的提交数"""
+        db = current_app.extensions['sqlalchemy']
+        models = get_models()
+        Submission = models['Submission']
+        SubmissionSearchKey = models['SubmissionSearchKey']
+
+        SubmissionSearchKey.query.delete(synchronize_session=False)
+        processed = 0
+        last_id = 0
+        while True:
+            batch = Submission.query.filter(Submission.id > last_id).order_by(Submission.id).limit(batch_size).all()
+            if not batch:
+                break
+            for submission in batch:
+                for field, attr in SEARCH_KEY_FIELDS.items():
+                    key = normalize_search_key(getattr(submission, attr))
+                    if key:
+                        db.session.add(SubmissionSearchKey(submission_id=submission.id, field=field, search_key=key))
+            db.session.flush()
+            processed += len(batch)
+            last_id = batch[-1].id
+        db.session.commit()
+        SearchService._cache.clear()
+        bump_content_version()
+        return processed
+
+
+# Convenience functions
+def sync_search_keys(submission):
+    """Convenience function for refreshing a submission's search keys"""
+    return SearchService.sync_keys(submission)
+
+
+def search_submissions(q: str, limit: int = MAX_RESULTS):
+    """Convenience function for exact-match professor search"""
+    return SearchService.search(q, limit)
+
+
+def search_cache_keys(submission) -> set:
+    """Convenience function for collecting a submission's search keys before it changes"""
+    return SearchService.keys_for(submission)
+
+
+def invalidate_search_cache(keys) -> None:
+    """Convenience function for dropping cached search results for these keys"""
+    SearchService.invalidate(keys)
+
+
+def rebuild_search_keys() -> int:
+    """Convenience function for rebuilding all search keys"""
+    return SearchService.rebuild()
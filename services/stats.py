@@ -0,0 +1,165 @@
+"""
+Site statistics service for NYU CLASS Professor Review System
+
+This module maintains the SiteStats snapshot row (approved totals, homepage
+total, last update time, pending appeals). The snapshot is refreshed when a
+submission or appeal changes status, and in the background once it is older
+than STATS_REFRESH_INTERVAL, so requests only ever read one row by primary key.
+
+The same row carries content_version, a counter bumped whenever public
+content changes. Per-worker caches (homepage payload, search results) put
+it in their keys, so an invalidation in one gunicorn worker reaches all of
+them on their next request.
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+from flask import current_app
+from sqlalchemy import func, case, update
+from background_tasks import get_task_manager
+from models import get_models
+
+SNAPSHOT_ID = 1
+
+
+class SiteStatsService:
+    """Service for the precomputed site statistics snapshot"""
+
+    # 避免同一进程内重复提交后台刷新任务
+    _refresh_lock = threading.Lock()
+    _refresh_scheduled_at = 0.0
+
+    @staticmethod
+    def refresh():
+        """重新计算所有聚合并写入快照行，返回快照对象"""
+        db = current_app.extensions['sqlalchemy']
+        models = get_models()
+        ReviewStatus = models['ReviewStatus']
+        Submission = models['Submission']
+        Appeal = models['Appeal']
+        SiteStats = models['SiteStats']
+
+        # 一次扫描得到已通过总数、首页可展示数和最近更新时间
+        approved_count, homepage_count, last_updated = db.session.query(
+            func.count(Submission.id),
+            func.coalesce(func.sum(case((Submission.privacy_homepage.is_(True), 1), else_=0)), 0),
+            func.max(Submission.updated_at),
+        ).filter(Submission.status == ReviewStatus.APPROVED).one()
+        pending_appeals_count = db.session.query(func.count(Appeal.id)).filter(
+            Appeal.status == "pending"
+        ).scalar()
+
+        snapshot = db.session.get(SiteStats, SNAPSHOT_ID)
+        if snapshot is None:
+            snapshot = SiteStats(id=SNAPSHOT_ID)
+            db.session.add(snapshot)
+        snapshot.approved_count = approved_count
+        snapshot.homepage_count = int(homepage_count)
+        snapshot.pending_appeals_count = pending_appeals_count
+        snapshot.last_updated = last_updated
+        snapshot.refreshed_at = datetime.utcnow()
+        db.session.commit()
+        return snapshot
+
+    @staticmethod
+    def _refresh_in_background():
+        """快照过期时提交后台刷新任务（每个进程同时最多一个）"""
+        interval = current_app.config.get('STATS_REFRESH_INTERVAL', 300)
+        with SiteStatsService._refresh_lock:
+            now = time.monotonic()
+            if now - SiteStatsService._refresh_scheduled_at < interval:
+                return
+            SiteStatsService._refresh_scheduled_at = now
+
+        task_manager = get_task_manager(current_app._get_current_object())
+        task_manager.submit_task(
+            f"site_stats_refresh_{int(time.time())}",
+            SiteStatsService.refresh,
+            max_retries=1
+        )
+
+    @staticmethod
+    def get_stats() -> dict:
+        """
+        读取统计快照（主键查询）。快照不存在时同步生成一次，
+        过期时返回旧值并在后台刷新
+        """
+        db = current_app.extensions['sqlalchemy']
+        SiteStats = get_models()['SiteStats']
+
+        snapshot = db.session.get(SiteStats, SNAPSHOT_ID)
+        if snapshot is None:
+            snapshot = SiteStatsService.refresh()
+        else:
+            interval = current_app.config.get('STATS_REFRESH_INTERVAL', 300)
+            age = (datetime.utcnow() - snapshot.refreshed_at).total_seconds()
+            if interval > 0 and age > interval:
+                SiteStatsService._refresh_in_background()
+
+        last_updated = snapshot.last_updated
+        # Convert to America/New_York timezone for display on homepage
+        if last_updated is not None:
+            # Treat naive timestamps as UTC
+            if getattr(last_updated, 'tzinfo', None) is None:
+                last_updated = last_updated.replace(tzinfo=timezone.utc)
+            last_updated = last_updated.astimezone(ZoneInfo("America/New_York"))
+
+        return {
+            'approved_count': snapshot.approved_count,
+            'homepage_count': snapshot.homepage_count,
+            'pending_appeals_count': snapshot.pending_appeals_count,
+            'last_updated': last_updated,
+            'refreshed_at': snapshot.refreshed_at,
+        }
+
+    @staticmethod
+    def content_version() -> int:
+        """读取公开内容版本号（主键查询，同一请求内由 identity map 复用）"""
+        db = current_app.extensions['sqlalchemy']
+        SiteStats = get_models()['SiteStats']
+        snapshot = db.session.get(SiteStats, SNAPSHOT_ID)
+        if snapshot is None:
+            snapshot = SiteStatsService.refresh()
+        return snapshot.content_version or 0
+
+    @staticmethod
+    def bump_content_version() -> None:
+        """公开内容变化后递增版本号并提交，所有worker的相关缓存随之失效"""
+        db = current_app.extensions['sqlalchemy']
+        SiteStats = get_models()['SiteStats']
+        updated = db.session.execute(
+            update(SiteStats)
+            .where(SiteStats.id == SNAPSHOT_ID)
+            .values(content_version=SiteStats.content_version + 1)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if not updated:
+            SiteStatsService.refresh()
+
+
+# Convenience functions
+def get_site_stats() -> dict:
+    """Convenience function for reading the site statistics snapshot"""
+    return SiteStatsService.get_stats()
+
+
+def refresh_site_stats():
+    """Convenience function for recomputing the site statistics snapshot"""
+    try:
+        return SiteStatsService.refresh()
+    except Exception as e:
+        current_app.extensions['sqlalchemy'].session.rollback()
+        current_app.logger.error(f"刷新站点统计失败: {e}")
+        return None
+
+
+def bump_content_version() -> None:
+    """Convenience function for invalidating content caches in every worker"""
+    try:
+        SiteStatsService.bump_content_version()
+    except Exception as e:
+        current_app.extensions['sqlalchemy'].session.rollback()
+        current_app.logger.error(f"更新内容版本号失败: {e}")
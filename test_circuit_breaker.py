@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+熔断器状态机回归测试（不需要数据库）
+覆盖 closed -> open -> half_open -> closed 的状态转换、半开状态只由探测调用决定、
+旧周期凭证的迟到结果被忽略，以及 on_state_change 在锁外调用。
+
+    python3 -m pytest test_circuit_breaker.py
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import utils.circuit_breaker as circuit_breaker
+from utils.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+
+class FakeClock:
+    """可手动推进的 time.monotonic 替身"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", fake)
+    return fake
+
+
+def make_breaker(**kwargs):
+    options = dict(window=4, min_calls=2, failure_rate=0.5, slow_call_seconds=5.0,
+                   slow_call_rate=0.5, open_seconds=30.0, half_open_calls=1)
+    options.update(kwargs)
+    return CircuitBreaker(**options)
+
+
+def trip(breaker):
+    """连续两次失败使熔断器打开"""
+    for _ in range(2):
+        permit = breaker.allow()
+        assert permit is not None
+        breaker.record(True, 0.1, permit)
+    assert breaker.state == OPEN
+
+
+def test_closed_open_half_open_closed(clock):
+    breaker = make_breaker()
+    assert breaker.state == CLOSED
+
+    trip(breaker)
+    assert breaker.allow() is None
+    assert breaker.retry_after() == pytest.approx(30.0)
+
+    clock.advance(30)
+    assert breaker.state == HALF_OPEN
+    probe = breaker.allow()
+    assert probe is not None and probe.probe
+    # 探测名额已用完，其余调用仍被拒绝
+    assert breaker.allow() is None
+
+    breaker.record(False, 0.1, probe)
+    assert breaker.state == CLOSED
+    assert breaker.allow() is not None
+
+
+def test_failed_or_slow_probe_reopens(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.advance(30)
+    probe = breaker.allow()
+    breaker.record(False, 6.0, probe)  # 慢调用
+    assert breaker.state == OPEN
+    assert breaker.allow() is None
+
+    clock.advance(30)
+    probe = breaker.allow()
+    breaker.record(True, 0.1, probe)
+    assert breaker.state == OPEN
+
+
+def test_slow_calls_open_breaker(clock):
+    breaker = make_breaker()
+    for _ in range(2):
+        breaker.record(False, 6.0, breaker.allow())
+    assert breaker.state == OPEN
+
+
+def test_stale_result_does_not_decide_half_open(clock):
+    breaker = make_breaker()
+    # 打开前放行、迟迟未返回的调用
+    stale = breaker.allow()
+    trip(breaker)
+    clock.advance(30)
+    probe = breaker.allow()
+    assert probe is not None
+
+    breaker.record(False, 0.1, stale)
+    assert breaker.state == HALF_OPEN
+    breaker.record(True, 0.1, stale)
+    assert breaker.state == HALF_OPEN
+
+    breaker.record(False, 0.1, probe)
+    assert breaker.state == CLOSED
+
+
+def test_stale_result_ignored_after_close(clock):
+    breaker = make_breaker()
+    stale = breaker.allow()
+    trip(breaker)
+    clock.advance(30)
+    breaker.record(False, 0.1, breaker.allow())
+    assert breaker.state == CLOSED
+
+    # 上一个周期的失败结果不计入新的统计窗口
+    breaker.record(True, 0.1, stale)
+    breaker.record(True, 0.1, stale)
+    assert breaker.state == CLOSED
+    assert breaker.allow() is not None
+
+
+def test_released_probe_can_be_reused(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.advance(30)
+    probe = breaker.allow()
+    assert breaker.allow() is None
+    breaker.release(probe)
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow() is not None
+
+
+def test_on_state_change_called_outside_lock(clock):
+    transitions = []
+    breaker = None
+
+    def on_state_change(old_state, new_state):
+        # 持有锁时回调会在这里死锁（Lock 不可重入），所以用非阻塞获取验证
+        acquired = breaker._lock.acquire(blocking=False)
+        if acquired:
+            breaker._lock.release()
+        transitions.append((old_state, new_state, acquired))
+
+    breaker = make_breaker(on_state_change=on_state_change)
+    trip(breaker)
+    clock.advance(30)
+    breaker.record(False, 0.1, breaker.allow())
+
+    assert transitions == [
+        (CLOSED, OPEN, True),
+        (OPEN, HALF_OPEN, True),
+        (HALF_OPEN, CLOSED, True),
+    ]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
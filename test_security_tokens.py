@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+签名token校验回归测试（不需要数据库）
+篡改过的token、含非ASCII字符的token以及非字符串token都应返回False，而不是抛出异常。
+
+    python3 -m pytest test_security_tokens.py
+"""
+
+import os
+import sys
+import time
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.security import (
+    generate_comment_status_token, verify_comment_status_token,
+    generate_detail_access_token, verify_detail_access_token,
+    generate_email_access_token, verify_email_access_token,
+)
+
+SECRET = "test-secret"
+
+
+# 篡改方式：改一个字符、截断、追加非ASCII字符、整体替换为非ASCII字符
+def tampered(token: str) -> list:
+    flipped = ("0" if token[-1] != "0" else "1")
+    return [
+        token[:-1] + flipped,
+        token[:-1],
+        token + "é",
+        token[:-1] + "中",
+        "令牌" * 8,
+        "",
+        None,
+    ]
+
+
+@pytest.fixture
+def app_context():
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY=SECRET, DETAIL_TOKEN_TTL=1800, DETAIL_TOKEN_BUCKET=300)
+    with app.app_context():
+        yield app
+
+
+def test_comment_status_token():
+    token = generate_comment_status_token(42, SECRET)
+    assert verify_comment_status_token(42, token, SECRET)
+    assert not verify_comment_status_token(43, token, SECRET)
+    for bad in tampered(token):
+        assert verify_comment_status_token(42, bad, SECRET) is False
+
+
+def test_email_access_token():
+    token = generate_email_access_token(7, "A@Example.com ", SECRET)
+    assert verify_email_access_token(7, "a@example.com", token, SECRET)
+    for bad in tampered(token):
+        assert verify_email_access_token(7, "a@example.com", bad, SECRET) is False
+
+
+def test_detail_access_token(app_context):
+    token = generate_detail_access_token(5, "home")
+    assert verify_detail_access_token(5, "home", token, SECRET)
+    assert not verify_detail_access_token(5, "search", token, SECRET)
+    assert not verify_detail_access_token(6, "home", token, SECRET)
+    for bad in tampered(token):
+        assert verify_detail_access_token(5, "home", bad, SECRET) is False
+
+    expires_at, signature = token.split(".", 1)
+    assert verify_detail_access_token(5, "home", f"{expires_at}.{signature[:-1]}ü", SECRET) is False
+    assert verify_detail_access_token(5, "home", f"{expires_at}x.{signature}", SECRET) is False
+
+
+def test_expired_detail_access_token(app_context, monkeypatch):
+    token = generate_detail_access_token(5, "home")
+    expires_at = int(token.split(".", 1)[0])
+    monkeypatch.setattr(time, "time", lambda: expires_at + 1)
+    assert verify_detail_access_token(5, "home", token, SECRET) is False
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
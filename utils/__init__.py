@@ -6,20 +6,35 @@ that are used across the application.
 """
 
 # 方便导入的快捷方式
-from .security import sanitize_html, validate_file_security, RateLimiter, clean_expired_sessions
+from .security import sanitize_html, validate_file_security, RateLimiter
 from .file_handler import allowed_file, generate_privacy_thumbnail
 from .decorators import admin_required, rate_limit
 from .email_sender import send_html_email, send_admin_notification
+from .cache import TTLCache, MISSING
+from .bloom import BloomFilter
+from .keyword_matcher import KeywordMatcher
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+from .pagination import encode_cursor, decode_cursor
+from .sessions import ServerSideSessionInterface, create_session_interface
 
 __all__ = [
     'sanitize_html',
     'validate_file_security', 
     'RateLimiter',
-    'clean_expired_sessions',
     'allowed_file',
     'generate_privacy_thumbnail',
     'admin_required',
     'rate_limit',
     'send_html_email',
-    'send_admin_notification'
+    'send_admin_notification',
+    'TTLCache',
+    'MISSING',
+    'BloomFilter',
+    'KeywordMatcher',
+    'CircuitBreaker',
+    'CircuitOpenError',
+    'encode_cursor',
+    'decode_cursor',
+    'ServerSideSessionInterface',
+    'create_session_interface'
 ]
\ No newline at end of file
@@ -0,0 +1,52 @@
+"""
+Bloom filter for NYU Dating Copilot
+
+This module contains a small thread-safe Bloom filter used to answer
+"definitely not present" membership checks in memory before touching the
+database. It has no false negatives; false positives fall through to the
+normal indexed lookup.
+"""
+
+import math
+import hashlib
+import threading
+
+
+class BloomFilter:
+    """固定容量的Bloom过滤器（进程内，不跨gunicorn worker共享）"""
+
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.01):
+        capacity = max(1, capacity)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        # 标准公式：m = -n·ln(p) / (ln2)^2，k = m/n·ln2
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def _positions(self, item: str):
+        # 双重哈希：由一个128位摘要派生k个位置
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, item: str) -> None:
+        """加入元素；重复加入不会增加计数，便于增量刷新时重叠扫描"""
+        positions = self._positions(item)
+        with self._lock:
+            if all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in positions):
+                return
+            for pos in positions:
+                self._bits[pos >> 3] |= 1 << (pos & 7)
+            self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    @property
+    def saturated(self) -> bool:
+        """插入数量超过设计容量时误判率会上升，需要按更大容量重建"""
+        return self.count > self.capacity
@@ -0,0 +1,61 @@
+"""
+Caching utilities for NYU Dating Copilot
+
+This module contains a small thread-safe in-process cache used to keep
+hot, rarely-changing query results out of the request path.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+
+# 用于区分"未命中"和"缓存了None/空结果"
+MISSING = object()
+
+
+class TTLCache:
+    """线程安全的LRU缓存，每个条目带过期时间（进程内，不跨gunicorn worker共享）"""
+
+    def __init__(self, maxsize: int = 256, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        """获取缓存值，过期或不存在时返回default"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float = None) -> None:
+        """写入缓存，超过容量时淘汰最久未使用的条目"""
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key) -> None:
+        """删除单个条目"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
@@ -0,0 +1,166 @@
+"""
+Circuit breaker for NYU Dating Copilot
+
+This module contains a small thread-safe circuit breaker for calls to an
+external provider. It keeps the outcomes of the last `window` calls and
+opens when, after at least `min_calls` calls, the failure rate or the
+slow-call rate reaches its threshold. While open every call is refused
+immediately; after `open_seconds` the breaker turns half-open and lets
+`half_open_calls` probe calls through. A successful probe closes it again,
+a failed or slow probe re-opens it for another `open_seconds`.
+
+allow() hands out a permit that is passed back to record(). Permits are
+tied to the state period they were issued in, so only a probe's own result
+decides the half-open transition; late results of calls admitted before
+the breaker opened are ignored. on_state_change is called after the lock
+has been released.
+
+State is per process (not shared between gunicorn workers).
+"""
+
+import time
+import threading
+from collections import deque, namedtuple
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+# allow() 发放的调用凭证：epoch 为发放时的状态周期，probe 表示半开状态下的探测调用
+Permit = namedtuple('Permit', ['epoch', 'probe'])
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，调用被直接拒绝"""
+
+
+class CircuitBreaker:
+    """基于失败率和慢调用率的熔断器（进程内）"""
+
+    def __init__(self, window: int = 20, min_calls: int = 5, failure_rate: float = 0.5,
+                 slow_call_seconds: float = 10.0, slow_call_rate: float = 0.5,
+                 open_seconds: float = 30.0, half_open_calls: int = 1, on_state_change=None):
+        self.window = max(1, window)
+        self.min_calls = max(1, min(min_calls, self.window))
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = max(1, half_open_calls)
+        self.on_state_change = on_state_change
+
+        # 最近的调用结果：(是否失败, 是否慢调用)
+        self._outcomes = deque(maxlen=self.window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        # 每次状态变化加一；旧周期发放的凭证的结果不再影响当前状态
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            transition = self._maybe_half_open()
+            state = self._state
+        self._notify(transition)
+        return state
+
+    def _set_state(self, state: str):
+        """切换状态（调用方持有锁），返回 (旧状态, 新状态)；状态未变化时返回 None"""
+        old_state = self._state
+        self._state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        if state != HALF_OPEN:
+            self._probes = 0
+        if state == CLOSED:
+            self._outcomes.clear()
+        if old_state == state:
+            return None
+        self._epoch += 1
+        return old_state, state
+
+    def _notify(self, transition) -> None:
+        # 在锁外调用回调，回调中可以安全地读取熔断器状态
+        if transition is not None and self.on_state_change is not None:
+            self.on_state_change(*transition)
+
+    def _maybe_half_open(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            return self._set_state(HALF_OPEN)
+        return None
+
+    def allow(self):
+        """
+        是否允许本次调用：允许时返回 Permit，拒绝时返回 None。
+        半开状态下占用一个探测名额；调用结束后必须以该凭证调用 record()，未发出调用时调用 release()
+        """
+        with self._lock:
+            transition = self._maybe_half_open()
+            permit = None
+            if self._state == CLOSED:
+                permit = Permit(self._epoch, False)
+            elif self._state == HALF_OPEN and self._probes < self.half_open_calls:
+                self._probes += 1
+                permit = Permit(self._epoch, True)
+        self._notify(transition)
+        return permit
+
+    def release(self, permit) -> None:
+        """归还未实际发出调用的凭证（不计入结果）；探测名额可被下一次调用使用"""
+        if permit is None or not permit.probe:
+            return
+        with self._lock:
+            if self._state == HALF_OPEN and permit.epoch == self._epoch and self._probes > 0:
+                self._probes -= 1
+
+    def retry_after(self) -> float:
+        """距离下一次允许探测的秒数（未打开时为 0）"""
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+
+    def record(self, failed: bool, latency: float, permit=None) -> None:
+        """
+        记录一次调用结果（latency 为秒）。半开状态下只有本周期探测调用的结果决定状态；
+        其他周期发放的凭证（如打开前已放行、迟到的调用）的结果被忽略
+        """
+        slow = latency >= self.slow_call_seconds
+        with self._lock:
+            transition = self._record(failed, slow, permit)
+        self._notify(transition)
+
+    def _record(self, failed: bool, slow: bool, permit):
+        # 调用方持有锁
+        if permit is not None and permit.epoch != self._epoch:
+            return None
+        if self._state == HALF_OPEN:
+            if permit is None or not permit.probe:
+                return None
+            return self._set_state(OPEN if failed or slow else CLOSED)
+        if self._state == OPEN:
+            return None
+
+        self._outcomes.append((failed, slow))
+        total = len(self._outcomes)
+        if total < self.min_calls:
+            return None
+        failures = sum(1 for f, _ in self._outcomes if f)
+        slow_calls = sum(1 for _, s in self._outcomes if s)
+        if failures / total >= self.failure_rate or slow_calls / total >= self.slow_call_rate:
+            return self._set_state(OPEN)
+        return None
+
+    def record_success(self, latency: float, permit=None) -> None:
+        self.record(False, latency, permit)
+
+    def record_failure(self, latency: float, permit=None) -> None:
+        self.record(True, latency, permit)
+
+    def reset(self) -> None:
+        with self._lock:
+            transition = self._set_state(CLOSED)
+        self._notify(transition)
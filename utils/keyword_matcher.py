@@ -0,0 +1,67 @@
+"""
+Aho-Corasick keyword matcher for NYU Dating Copilot
+
+This module contains a small pure-Python Aho-Corasick automaton that finds
+every occurrence of a fixed keyword list in one pass over the text, so the
+cost of a scan does not grow with the number of keywords. It is built once
+and is read-only afterwards, so one instance can be shared between threads.
+"""
+
+from collections import deque
+
+
+class KeywordMatcher:
+    """多关键词匹配（Aho-Corasick），关键词按小写匹配"""
+
+    def __init__(self, keywords):
+        # 每个状态：转移表、失败指针、在该状态结束的 (关键词, 标签)
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        self.size = 0
+
+        for keyword, label in keywords:
+            keyword = keyword.lower()
+            if not keyword:
+                continue
+            state = 0
+            for char in keyword:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[state][char] = next_state
+                state = next_state
+            self._output[state].append((keyword, label))
+            self.size += 1
+
+        # 按BFS顺序计算失败指针，并把失败链上的输出合并到当前状态
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find_all(self, text: str) -> list:
+        """返回所有命中 [(start, end, 关键词, 标签)]，end 为开区间"""
+        matches = []
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for index, char in enumerate(text.lower()):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for keyword, label in output[state]:
+                matches.append((index + 1 - len(keyword), index + 1, keyword, label))
+        return matches
+
+    def labels(self, text: str) -> set:
+        """返回命中的标签集合"""
+        return {label for _, _, _, label in self.find_all(text)}
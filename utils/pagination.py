@@ -0,0 +1,27 @@
+"""
+Keyset pagination cursors for NYU Dating Copilot
+
+This module encodes a (timestamp, id) position as an opaque URL-safe cursor
+and decodes it back. Feeds paginate with WHERE (ts, id) > cursor instead of
+OFFSET, so every page costs the same as the first one.
+"""
+
+import base64
+from datetime import datetime
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """将(时间戳, id)编码为不透明的分页游标"""
+    raw = f"{timestamp.isoformat()}|{row_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """解析分页游标，格式错误时抛出ValueError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+        timestamp_str, id_str = raw.rsplit('|', 1)
+        return datetime.fromisoformat(timestamp_str), int(id_str)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
@@ -2,7 +2,7 @@
 Security utilities for NYU Dating Copilot
 
 This module contains security-related functions including rate limiting,
-session management, file validation, and content sanitization.
+signed detail-page and comment-status tokens, file validation, and content sanitization.
 """
 
 import time
@@ -11,10 +11,10 @@ import hmac
 import magic
 import bleach
 from collections import defaultdict
-from flask import session, current_app as app
+from flask import url_for, current_app as app
 from werkzeug.utils import secure_filename
 
-# Session configuration
+# 详情页访问token默认有效期
 SESSION_TIMEOUT = 1800  # 30分钟
 
 
@@ -64,23 +64,6 @@ class RateLimiter:
         return max(0, limit - len(self.requests[ip]))
 
 
-def clean_expired_sessions():
-    """清理过期的session数据"""
-    current_time = time.time()
-    
-    # 清理过期的搜索session
-    search_session = session.get('accessible_search_ids')
-    if search_session and current_time - search_session.get('timestamp', 0) > SESSION_TIMEOUT:
-        session.pop('accessible_search_ids', None)
-        app.logger.info("Cleaned expired search session")
-    
-    # 清理过期的首页session
-    homepage_session = session.get('accessible_homepage_ids')
-    if homepage_session and current_time - homepage_session.get('timestamp', 0) > SESSION_TIMEOUT:
-        session.pop('accessible_homepage_ids', None)
-        app.logger.info("Cleaned expired homepage session")
-
-
 def validate_file_security(file, file_type):
     """Validate file extension, MIME type, and size for security"""
     if not file or not file.filename:
@@ -143,6 +126,94 @@ def sanitize_html(text):
     return bleach.clean(text, tags=allowed_tags, attributes=allowed_attributes, strip=True)
 
 
+def _tokens_equal(expected: str, token) -> bool:
+    """常量时间比较token；按UTF-8字节比较，含非ASCII字符的伪造token返回False而不是抛出TypeError"""
+    if not isinstance(token, str):
+        return False
+    return hmac.compare_digest(expected.encode('utf-8'), token.encode('utf-8'))
+
+
+def _detail_token_signature(submission_id: int, source: str, expires_at: int, secret_key: str) -> str:
+    data = f"detail:{submission_id}:{source}:{expires_at}"
+    return hmac.new(
+        secret_key.encode('utf-8'),
+        data.encode('utf-8'),
+        hashlib.sha256
+    ).hexdigest()[:32]
+
+
+def generate_detail_access_token(submission_id: int, source: str, secret_key: str = None) -> str:
+    """
+    为详情页访问生成短期签名token（格式: 过期时间戳.签名）
+    过期时间按 DETAIL_TOKEN_BUCKET 对齐，同一时间段内同一链接的token相同，
+    因此带token的首页/搜索结果可以被缓存；有效期为 DETAIL_TOKEN_TTL 到 TTL+BUCKET 之间
+    """
+    if secret_key is None:
+        secret_key = app.config.get('SECRET_KEY', 'default-key')
+    ttl = app.config.get('DETAIL_TOKEN_TTL', SESSION_TIMEOUT)
+    bucket = max(1, app.config.get('DETAIL_TOKEN_BUCKET', 300))
+    expires_at = (int(time.time() + ttl) // bucket + 1) * bucket
+    return f"{expires_at}.{_detail_token_signature(submission_id, source, expires_at, secret_key)}"
+
+
+def verify_detail_access_token(submission_id: int, source: str, token: str, secret_key: str = None) -> bool:
+    """验证详情页访问token：签名匹配（绑定ID和来源）且未过期"""
+    if not token or '.' not in token:
+        return False
+    expires_str, signature = token.split('.', 1)
+    try:
+        expires_at = int(expires_str)
+    except ValueError:
+        return False
+    if expires_at < time.time():
+        return False
+    if secret_key is None:
+        secret_key = app.config.get('SECRET_KEY', 'default-key')
+    expected = _detail_token_signature(submission_id, source, expires_at, secret_key)
+    return _tokens_equal(expected, signature)
+
+
+def detail_access_url(submission_id: int, source: str, from_privacy: bool = False) -> str:
+    """生成带签名token的详情页链接（首页卡片、搜索结果、邮件入口使用）"""
+    params = {'source': source, 'token': generate_detail_access_token(submission_id, source)}
+    if from_privacy:
+        params['from_privacy'] = '1'
+    return url_for('main.submission_detail', submission_id=submission_id, **params)
+
+
+def generate_comment_status_token(comment_id: int, secret_key: str = None) -> str:
+    """为评论审核状态查询生成签名token（只返回给发表该评论的请求）"""
+    if secret_key is None:
+        secret_key = app.config.get('SECRET_KEY', 'default-key')
+    return hmac.new(
+        secret_key.encode('utf-8'),
+        f"comment-status:{comment_id}".encode('utf-8'),
+        hashlib.sha256
+    ).hexdigest()[:32]
+
+
+def verify_comment_status_token(comment_id: int, token: str, secret_key: str = None) -> bool:
+    """验证评论审核状态token"""
+    if not token:
+        return False
+    return _tokens_equal(generate_comment_status_token(comment_id, secret_key), token)
+
+
+def compute_like_fingerprint(user_ip: str, user_agent_hash: str, secret_key: str = None) -> int:
+    """
+    点赞去重用的64位指纹：HMAC-SHA256(IP|User-Agent的MD5) 取前8字节作为有符号整数（BIGINT）
+    密钥为 LIKE_FINGERPRINT_KEY（未设置时使用 SECRET_KEY），更换密钥会使已有点赞无法匹配
+    """
+    if secret_key is None:
+        secret_key = app.config.get('LIKE_FINGERPRINT_KEY') or app.config.get('SECRET_KEY', 'default-key')
+    digest = hmac.new(
+        secret_key.encode('utf-8'),
+        f"{user_ip}|{user_agent_hash}".encode('utf-8'),
+        hashlib.sha256
+    ).digest()
+    return int.from_bytes(digest[:8], 'big', signed=True)
+
+
 def generate_email_access_token(submission_id: int, email: str, secret_key: str = None) -> str:
     """
     为邮件访问生成安全token
@@ -168,4 +239,4 @@ def verify_email_access_token(submission_id: int, email: str, token: str, secret
     验证邮件访问token是否有效
     """
     expected_token = generate_email_access_token(submission_id, email, secret_key)
-    return hmac.compare_digest(expected_token, token)
\ No newline at end of file
+    return _tokens_equal(expected_token, token)
\ No newline at end of file
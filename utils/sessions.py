@@ -0,0 +1,253 @@
+"""
+Server-side session storage for NYU Dating Copilot
+
+This module replaces Flask's signed-cookie session with a server-side store:
+the cookie only carries a fixed-size random session ID, and the session data
+lives in a table with an expires_at column. Expiry is checked on the single
+row being loaded, and expired rows are removed by a periodic background
+job (purge_expired_sessions, every SESSION_PURGE_INTERVAL seconds) with an
+indexed range delete. Store errors are logged and never fail the request.
+
+Backends (SESSION_BACKEND):
+- sqlite:   a local SQLite file shared by all gunicorn workers on one host
+- postgres: an UNLOGGED table in the application database (multi-host)
+- cookie:   Flask's default signed cookie (no server-side storage)
+When SESSION_BACKEND is not set, PostgreSQL deployments use postgres and
+everything else keeps the cookie session.
+"""
+
+import os
+import time
+import secrets
+import sqlite3
+import threading
+from flask.sessions import SessionInterface, SecureCookieSession, session_json_serializer
+from sqlalchemy import text
+
+SESSION_ID_BYTES = 32
+
+
+class ServerSideSession(SecureCookieSession):
+    """带会话ID的session对象，数据保存在服务端"""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        super().__init__(initial)
+        self.sid = sid
+        self.new = new
+        self.regenerate_requested = False
+
+    def regenerate(self):
+        """登录等权限变化后更换会话ID，防止会话固定攻击"""
+        self.regenerate_requested = True
+        self.modified = True
+
+
+class SQLiteSessionStore:
+    """本地SQLite会话存储（WAL模式，每个线程一个连接）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions(expires_at)")
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def load(self, sid: str):
+        row = self._connection().execute(
+            "SELECT data FROM sessions WHERE sid = ? AND expires_at > ?", (sid, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def save(self, sid: str, data: str, expires_at: float) -> None:
+        self._connection().execute(
+            "INSERT INTO sessions (sid, data, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(sid) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at",
+            (sid, data, expires_at)
+        )
+
+    def touch(self, sid: str, expires_at: float) -> None:
+        self._connection().execute("UPDATE sessions SET expires_at = ? WHERE sid = ?", (expires_at, sid))
+
+    def delete(self, sid: str) -> None:
+        self._connection().execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def purge_expired(self) -> None:
+        self._connection().execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
+
+
+class PostgresSessionStore:
+    """PostgreSQL UNLOGGED表会话存储（不写WAL，崩溃后丢失会话可以接受）"""
+
+    def __init__(self, get_engine):
+        # 延迟获取engine：Flask-SQLAlchemy 需要在应用上下文中才能创建
+        self._get_engine = get_engine
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def _engine(self):
+        engine = self._get_engine()
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    with engine.begin() as conn:
+                        conn.execute(text(
+                            "CREATE UNLOGGED TABLE IF NOT EXISTS flask_sessions ("
+                            "sid VARCHAR(64) PRIMARY KEY, data TEXT NOT NULL, expires_at DOUBLE PRECISION NOT NULL)"
+                        ))
+                        conn.execute(text(
+                            "CREATE INDEX IF NOT EXISTS idx_flask_sessions_expires_at ON flask_sessions(expires_at)"
+                        ))
+                    self._ready = True
+        return engine
+
+    def load(self, sid: str):
+        with self._engine().connect() as conn:
+            return conn.execute(
+                text("SELECT data FROM flask_sessions WHERE sid = :sid AND expires_at > :now"),
+                {"sid": sid, "now": time.time()}
+            ).scalar()
+
+    def save(self, sid: str, data: str, expires_at: float) -> None:
+        with self._engine().begin() as conn:
+            conn.execute(text(
+                "INSERT INTO flask_sessions (sid, data, expires_at) VALUES (:sid, :data, :expires_at) "
+                "ON CONFLICT (sid) DO UPDATE SET data = EXCLUDED.data, expires_at = EXCLUDED.expires_at"
+            ), {"sid": sid, "data": data, "expires_at": expires_at})
+
+    def touch(self, sid: str, expires_at: float) -> None:
+        with self._engine().begin() as conn:
+            conn.execute(text("UPDATE flask_sessions SET expires_at = :expires_at WHERE sid = :sid"),
+                         {"sid": sid, "expires_at": expires_at})
+
+    def delete(self, sid: str) -> None:
+        with self._engine().begin() as conn:
+            conn.execute(text("DELETE FROM flask_sessions WHERE sid = :sid"), {"sid": sid})
+
+    def purge_expired(self) -> None:
+        with self._engine().begin() as conn:
+            conn.execute(text("DELETE FROM flask_sessions WHERE expires_at <= :now"), {"now": time.time()})
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Cookie中只保存会话ID，数据读写委托给store"""
+
+    session_class = ServerSideSession
+    serializer = session_json_serializer
+
+    def __init__(self, store):
+        self.store = store
+
+    @staticmethod
+    def _new_sid() -> str:
+        return secrets.token_urlsafe(SESSION_ID_BYTES)
+
+    @staticmethod
+    def _valid_sid(sid) -> bool:
+        # token_urlsafe(32) 固定为43个字符
+        return bool(sid) and len(sid) == 43 and all(c.isalnum() or c in '-_' for c in sid)
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if self._valid_sid(sid):
+            try:
+                raw = self.store.load(sid)
+            except Exception as e:
+                app.logger.error(f"读取session失败: {e}")
+                raw = None
+            if raw is not None:
+                try:
+                    return self.session_class(self.serializer.loads(raw), sid=sid)
+                except Exception:
+                    pass
+        return self.session_class(sid=self._new_sid(), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        # 存储层出错时只记录日志：本次session改动丢失，但不影响响应本身
+        try:
+            # session被清空：删除服务端记录和cookie
+            if not session:
+                if session.modified and not session.new:
+                    self.store.delete(session.sid)
+                    response.delete_cookie(name, domain=domain, path=path, secure=secure,
+                                           samesite=samesite, httponly=httponly)
+                return
+
+            expires_at = time.time() + app.permanent_session_lifetime.total_seconds()
+            if session.regenerate_requested and not session.new:
+                self.store.delete(session.sid)
+                session.sid = self._new_sid()
+
+            if session.modified:
+                self.store.save(session.sid, self.serializer.dumps(dict(session)), expires_at)
+            elif self.should_set_cookie(app, session):
+                # 未修改但需要续期（SESSION_REFRESH_EACH_REQUEST）：只更新过期时间
+                self.store.touch(session.sid, expires_at)
+            else:
+                return
+        except Exception as e:
+            app.logger.error(f"保存session失败: {e}")
+            return
+
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=httponly,
+            domain=domain,
+            path=path,
+            secure=secure,
+            samesite=samesite,
+        )
+
+
+def default_session_backend(database_uri: str) -> str:
+    """未显式配置 SESSION_BACKEND 时：PostgreSQL 部署使用应用数据库，其余保留cookie session"""
+    return 'postgres' if (database_uri or '').startswith('postgresql') else 'cookie'
+
+
+def purge_expired_sessions(app) -> None:
+    """后台周期任务：删除过期的服务端session记录"""
+    interface = app.session_interface
+    if isinstance(interface, ServerSideSessionInterface):
+        interface.store.purge_expired()
+
+
+def create_session_interface(app, db=None):
+    """按 SESSION_BACKEND 配置创建session接口，cookie 表示沿用Flask默认实现"""
+    backend = (app.config.get('SESSION_BACKEND') or
+               default_session_backend(app.config.get('SQLALCHEMY_DATABASE_URI'))).lower()
+    if backend == 'cookie':
+        return None
+    if backend == 'postgres':
+        if db is None:
+            raise ValueError("SESSION_BACKEND=postgres requires the SQLAlchemy instance")
+        return ServerSideSessionInterface(PostgresSessionStore(lambda: db.engine))
+    if backend == 'sqlite':
+        return ServerSideSessionInterface(SQLiteSessionStore(app.config['SESSION_SQLITE_PATH']))
+    raise ValueError(f"Unknown SESSION_BACKEND: {backend}")